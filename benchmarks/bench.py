@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_server import MockConfig, MockData, MockServer
+
+# Cases run by default, each in its own process so peak RSS is per case
+CASES = ["events", "events-table", "display-json", "display-table", "display-jsonl", "display-text", "hunt-pages", "hunt-summary", "download"]
+
+def load_script(filename):
+    """ Import one of the hyphen-named scripts without running its main() """
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def timed(function, latencies):
+    """ Wrap a function so the duration of every call is appended to latencies """
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    return wrapper
+
+def peak_rss_mb():
+    """ Peak resident set size of this process in MiB, None where resource is unavailable """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+@contextlib.contextmanager
+def quiet():
+    """ Send the scripts' output to /dev/null so only rendering cost is measured, not the terminal """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def api_client(latencies):
+    """ Shared FortiEDR client for the stand-in server, timing every HTTP request """
+    from fortiedr_client import get_client
+
+    client = get_client()
+    client.request = timed(client.request, latencies)
+    return client
+
+def case_events(args, output_format):
+    """ get_events over every page, rendered as JSON or tables """
+    script = load_script("fortiedr-api-list-events.py")
+    latencies = []
+    client = api_client(latencies)
+    with quiet():
+        script.get_events(client, max_items=args.events, output_format=output_format)
+    return args.events, latencies
+
+def case_display(args, output_format):
+    """ display_events alone, on events generated in memory, one call per page """
+    script = load_script("fortiedr-api-list-events.py")
+    data = MockData(MockConfig(samples=1, payload_bytes=args.payload_bytes, sample_bytes=16))
+    latencies = []
+    display = timed(script.display_events, latencies)
+    with quiet():
+        for start in range(0, args.events, script.PAGE_SIZE):
+            page = [data.event(i) for i in range(start, min(args.events, start + script.PAGE_SIZE))]
+            display(page, output_format)
+    return args.events, latencies
+
+def case_hunt(args, summary):
+    """ Threat-hunting search handling: every page pulled, or aggregated into the summary """
+    script = load_script("fortiedr-api-threat-hunting.py")
+    latencies = []
+    client = api_client(latencies)
+    search_params = script.build_search_params(category="All", time_period="last30days")
+    search_params.pop("itemsPerPage", None)
+
+    if summary:
+        with quiet():
+            script.run_search(client, search_params, "summary", args.hunting_records)
+        return args.hunting_records, latencies
+
+    items = 0
+    for page in script.iter_hunting_pages(client, search_params, args.hunting_records):
+        items += len(page)
+    return items, latencies
+
+def case_download(args):
+    """ download_and_unzip of every mock sample into an empty store """
+    from fortiedr_sample_store import SampleStore
+
+    script = load_script("fortiedr-malware-downloader.py")
+    latencies = []
+    script.download_sample = timed(script.download_sample, latencies)
+    with quiet():
+        hashes = script.fetch_hashes("", "exe", args.samples)
+        with tempfile.TemporaryDirectory() as root:
+            store = SampleStore(os.path.join(root, "Malwares"))
+            files = script.download_and_unzip(hashes, args.concurrency, store)
+            store.close()
+    return len(files), latencies
+
+def run_case(case, args):
+    """ Run one case in this process and return its measurements """
+    functions = {
+        "events": lambda: case_events(args, "json"),
+        "events-table": lambda: case_events(args, "table"),
+        "display-json": lambda: case_display(args, "json"),
+        "display-table": lambda: case_display(args, "table"),
+        "display-jsonl": lambda: case_display(args, "jsonl"),
+        "display-text": lambda: case_display(args, "text"),
+        "hunt-pages": lambda: case_hunt(args, summary=False),
+        "hunt-summary": lambda: case_hunt(args, summary=True),
+        "download": lambda: case_download(args),
+    }
+    started = time.perf_counter()
+    items, latencies = functions[case]()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latencies) or [0.0]
+    return {
+        "case": case,
+        "items": items,
+        "seconds": elapsed,
+        "items_per_second": items / elapsed if elapsed else 0.0,
+        "calls": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def child_command(case, args):
+    command = [sys.executable, os.path.abspath(__file__), "--case", case,
+               "--events", str(args.events), "--hunting-records", str(args.hunting_records),
+               "--samples", str(args.samples), "--payload-bytes", str(args.payload_bytes),
+               "--concurrency", str(args.concurrency)]
+    return command
+
+def print_results(results):
+    print(f"{'Case':<14} {'Items':>8} {'Seconds':>8} {'Items/s':>10} {'Calls':>6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'Peak RSS (MiB)':>15}")
+    for result in results:
+        rss = f"{result['peak_rss_mb']:.1f}" if result['peak_rss_mb'] is not None else "n/a"
+        print(f"{result['case']:<14} {result['items']:>8} {result['seconds']:>8.2f} {result['items_per_second']:>10.0f} "
+              f"{result['calls']:>6} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {rss:>15}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the FortiEDR scripts against the local stand-in server")
+    parser.add_argument("cases", nargs="*", metavar="CASE", help=f"Cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument("--events", type=int, default=20000, help="Events served and displayed")
+    parser.add_argument("--hunting-records", type=int, default=20000, help="Threat-hunting records served")
+    parser.add_argument("--samples", type=int, default=50, help="MalwareBazaar samples downloaded")
+    parser.add_argument("--sample-bytes", type=int, default=256 * 1024, help="Size of every sample")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="Padding added to every event and hunting record")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Server delay per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--concurrency", type=int, default=8, help="Download concurrency")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to a JSON file")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    unknown = [case for case in args.cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args)))
+        return
+
+    config = MockConfig(args.events, args.hunting_records, args.samples, args.payload_bytes, args.sample_bytes,
+                        args.latency_ms, args.error_rate)
+    server = MockServer(config).start()
+    env = dict(os.environ,
+               FORTIEDR_HOST=server.url, FORTIEDR_USER="bench", FORTIEDR_PASS="bench", FORTIEDR_ORG="bench",
+               MB_API_URL=server.url + "/api/v1/", USE_CUSTOM_CA="False")
+    print(f"Mock server on {server.url}: {args.events} events, {args.hunting_records} hunting records, "
+          f"{args.samples} samples, {args.latency_ms} ms latency, {args.error_rate:.0%} errors\n")
+
+    results = []
+    try:
+        for case in args.cases or CASES:
+            # Each case runs in a fresh interpreter, from an empty directory so local stores are not reused
+            with tempfile.TemporaryDirectory() as cwd:
+                completed = subprocess.run(child_command(case, args), env=env, cwd=cwd, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{case}: failed\n{completed.stderr}")
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    finally:
+        server.stop()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == "__main__":
+    main()
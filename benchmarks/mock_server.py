@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Synthetic values repeated across records, like real tenants
+DEVICES = [f"WIN-DESKTOP-{i:03d}" for i in range(50)]
+PROCESSES = ["powershell.exe", "cmd.exe", "rundll32.exe", "svchost.exe", "chrome.exe", "wscript.exe", "mshta.exe"]
+USERS = ["alice", "bob", "carol", "dave", "SYSTEM"]
+ACTIONS = ["Block", "SimulationBlock", "Log"]
+HUNTING_TYPES = ["Process Creation", "File Create", "File Write", "Registry Value Set", "Socket Connect", "Event Log"]
+TAGS = ["agenttesla", "lokibot", "mirai", "ransomware", "hydra"]
+
+class MockConfig:
+    """ Size, latency and error settings of the stand-in server """
+
+    def __init__(self, events=5000, hunting_records=5000, samples=20, payload_bytes=0, sample_bytes=64 * 1024,
+                 latency_ms=0, error_rate=0.0, seed=1):
+        self.events = events
+        self.hunting_records = hunting_records
+        self.samples = samples
+        self.payload_bytes = payload_bytes
+        self.sample_bytes = sample_bytes
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.seed = seed
+
+class MockData:
+    """ Deterministic synthetic FortiEDR events, threat-hunting records and MalwareBazaar samples """
+
+    def __init__(self, config):
+        self.config = config
+        self.start = datetime(2025, 1, 1)
+        self.padding = "x" * config.payload_bytes
+        rng = random.Random(config.seed)
+
+        self.samples = []
+        for i in range(config.samples):
+            content = rng.randbytes(config.sample_bytes)
+            self.samples.append({
+                "sha256_hash": hashlib.sha256(content).hexdigest(),
+                "first_seen": (self.start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+                "file_name": f"sample_{i}.exe",
+                "file_type": "exe",
+                "file_type_mime": "application/x-dosexec",
+                "signature": TAGS[i % len(TAGS)].capitalize(),
+                "tags": [TAGS[i % len(TAGS)], "exe"],
+                "content": content,
+            })
+        self.samples_by_hash = {sample["sha256_hash"]: sample for sample in self.samples}
+        self.archives = {}
+        self.archives_lock = threading.Lock()
+        # Events raised through /mock/trigger, served to lastSeen queries
+        self.live_events = []
+        self.live_lock = threading.Lock()
+
+    def trigger(self, rules, process="atomic-test", device=None, delay=0):
+        """ Add an event firing rules, seen delay seconds from now """
+        def add():
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with self.live_lock:
+                event_id = 900000 + len(self.live_events)
+                self.live_events.append({
+                    "eventId": event_id, "process": process, "processPath": process,
+                    "firstSeen": now, "lastSeen": now, "classification": "Malicious", "action": "Block",
+                    "rules": rules, "hash": f"{event_id:064x}",
+                    "collectors": [{"device": device or DEVICES[0], "ip": "10.0.0.1"}],
+                })
+        if delay:
+            threading.Timer(delay, add).start()
+        else:
+            add()
+
+    def live_page(self, last_seen_from, last_seen_to, page_number, items_per_page):
+        with self.live_lock:
+            events = [e for e in self.live_events if last_seen_from <= e["lastSeen"] <= (last_seen_to or "9999")]
+        start = page_number * items_per_page
+        return events[start:start + items_per_page]
+
+    def event(self, i):
+        first_seen = self.start + timedelta(seconds=i * 7)
+        event = {
+            "eventId": 100000 + i,
+            "process": PROCESSES[i % len(PROCESSES)],
+            "processPath": f"C:\\Windows\\System32\\{PROCESSES[i % len(PROCESSES)]}",
+            "firstSeen": first_seen.strftime("%Y-%m-%d %H:%M:%S"),
+            "lastSeen": (first_seen + timedelta(seconds=i % 300)).strftime("%Y-%m-%d %H:%M:%S"),
+            "classification": ["Malicious", "Suspicious", "PUP", "Likely Safe"][i % 4],
+            "action": ACTIONS[i % len(ACTIONS)],
+            "rules": ["Malicious File Detected"] if i % 2 else ["Suspicious Application"],
+            "hash": self.samples[i % len(self.samples)]["sha256_hash"] if self.samples and i % 10 == 0 else f"{i:064x}",
+            "collectors": [{"device": DEVICES[i % len(DEVICES)], "ip": f"10.0.{i % 256}.{i % 200}"}],
+        }
+        if self.padding:
+            event["padding"] = self.padding
+        return event
+
+    def hunting_record(self, i):
+        record = {
+            "ID": f"th-{i}",
+            "Time": int((self.start + timedelta(seconds=i * 3)).timestamp() * 1000),
+            "Category": "Process",
+            "Type": HUNTING_TYPES[i % len(HUNTING_TYPES)],
+            "Device": {"Name": DEVICES[i % len(DEVICES)], "OS": "Windows 10", "OSVersion": "10.0.19045"},
+            "Source": {"Process": {
+                "Name": PROCESSES[i % len(PROCESSES)],
+                "Path": f"C:\\Windows\\System32\\{PROCESSES[i % len(PROCESSES)]}",
+                "CommandLine": f"{PROCESSES[i % len(PROCESSES)]} -arg {i}",
+                "User": {"Username": USERS[i % len(USERS)]},
+            }},
+            "Target": {"File": {"Path": f"C:\\Users\\Public\\file_{i % 1000}.tmp"}},
+        }
+        if self.samples and i % 10 == 0:
+            # Every tenth record touches a MalwareBazaar sample, like the events
+            record["Target"]["File"]["Hash"] = self.samples[(i // 10) % len(self.samples)]["sha256_hash"]
+        if self.padding:
+            record["Padding"] = self.padding
+        return record
+
+    def hunting_page(self, params, page_number, items_per_page):
+        """ Threat-hunting records, restricted to the requested time range and devices when given """
+        first, last = 0, self.config.hunting_records
+        if params.get("fromTime") and params.get("toTime"):
+            # Record i is at start + 3i seconds
+            from_seconds = (datetime.strptime(params["fromTime"], "%Y-%m-%d %H:%M:%S") - self.start).total_seconds()
+            to_seconds = (datetime.strptime(params["toTime"], "%Y-%m-%d %H:%M:%S") - self.start).total_seconds()
+            first, last = max(first, int(-(-from_seconds // 3))), min(last, int(to_seconds // 3) + 1)
+        indexes = range(first, max(first, last))
+        if params.get("devices"):
+            devices = set(params["devices"])
+            indexes = [i for i in indexes if DEVICES[i % len(DEVICES)] in devices]
+        start = page_number * items_per_page
+        return [self.hunting_record(i) for i in indexes[start:start + items_per_page]]
+
+    def page(self, factory, total, page_number, items_per_page):
+        start = page_number * items_per_page
+        return [factory(i) for i in range(start, min(total, start + items_per_page))]
+
+    def archive(self, sha256):
+        """ AES zip of a sample, protected with the MalwareBazaar 'infected' password """
+        import pyzipper
+
+        with self.archives_lock:
+            if sha256 not in self.archives:
+                buffer = io.BytesIO()
+                with pyzipper.AESZipFile(buffer, "w", compression=pyzipper.ZIP_STORED, encryption=pyzipper.WZ_AES) as zf:
+                    zf.setpassword(b"infected")
+                    zf.writestr(f"{sha256}.exe", self.samples_by_hash[sha256]["content"])
+                self.archives[sha256] = buffer.getvalue()
+            return self.archives[sha256]
+
+def public_sample(sample):
+    return {key: value for key, value in sample.items() if key != "content"}
+
+def make_handler(data):
+    config = data.config
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def delay_or_fail(self):
+            """ Apply the configured latency, and return True when this request should fail """
+            if config.latency_ms:
+                time.sleep(config.latency_ms / 1000)
+            with rng_lock:
+                failed = rng.random() < config.error_rate
+            if failed:
+                self.send_body(503, b'{"errorMessage": "Service Unavailable"}', headers={"Retry-After": "0"})
+            return failed
+
+        def send_body(self, status, body, content_type="application/json", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            if url.path != "/management-rest/events/list-events":
+                self.send_body(404, b'{"errorMessage": "Not Found"}')
+                return
+            if self.delay_or_fail():
+                return
+
+            query = urllib.parse.parse_qs(url.query)
+            page_number = int(query.get("pageNumber", ["0"])[0])
+            items_per_page = int(query.get("itemsPerPage", ["100"])[0])
+            if "lastSeenFrom" in query:
+                # Polling for new events only sees the triggered ones
+                last_seen_to = query.get("lastSeenTo", [None])[0]
+                page = data.live_page(query["lastSeenFrom"][0], last_seen_to, page_number, items_per_page)
+            else:
+                page = data.page(data.event, config.events, page_number, items_per_page)
+            self.send_body(200, json.dumps(page).encode())
+
+        def do_POST(self):
+            body = self.read_body()
+            if self.path == "/management-rest/threat-hunting/search":
+                if self.delay_or_fail():
+                    return
+                params = json.loads(body or b"{}")
+                page_number = int(params.get("pageNumber", 0))
+                items_per_page = int(params.get("itemsPerPage", 100))
+                page = data.hunting_page(params, page_number, items_per_page)
+                self.send_body(200, json.dumps(page).encode())
+            elif self.path == "/mock/trigger":
+                params = json.loads(body or b"{}")
+                data.trigger(params.get("rules") or [], params.get("process", "atomic-test"), params.get("device"), float(params.get("delay", 0)))
+                self.send_body(200, b'{"status": "scheduled"}')
+            elif self.path.rstrip("/") == "/api/v1":
+                if self.delay_or_fail():
+                    return
+                self.mb_api(urllib.parse.parse_qs(body.decode()))
+            else:
+                self.send_body(404, b'{"errorMessage": "Not Found"}')
+
+        def mb_api(self, form):
+            query = form.get("query", [""])[0]
+            limit = int(form.get("limit", form.get("selector", ["100"]))[0] or 100)
+
+            if query == "get_file":
+                sha256 = form.get("sha256_hash", [""])[0]
+                if sha256 not in data.samples_by_hash:
+                    self.send_body(200, b'{"query_status": "file_not_found"}')
+                    return
+                self.send_body(200, data.archive(sha256), content_type="application/zip")
+                return
+
+            samples = data.samples
+            if query == "get_taginfo":
+                tag = form.get("tag", [""])[0].lower()
+                samples = [s for s in samples if tag in s["tags"]]
+            elif query == "get_file_type":
+                samples = [s for s in samples if s["file_type"] == form.get("file_type", [""])[0].lower()]
+            elif query != "get_recent":
+                self.send_body(200, b'{"query_status": "illegal_query"}')
+                return
+
+            payload = {"query_status": "ok" if samples else "no_results", "data": [public_sample(s) for s in samples[:limit]]}
+            self.send_body(200, json.dumps(payload).encode())
+
+    return Handler
+
+class MockServer:
+    """ Threaded stand-in for the FortiEDR management API and the MalwareBazaar API """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.data = MockData(self.config)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.data))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stand-in FortiEDR / MalwareBazaar REST server with synthetic data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--events", type=int, default=5000, help="Total list-events records")
+    parser.add_argument("--hunting-records", type=int, default=5000, help="Total threat-hunting records")
+    parser.add_argument("--samples", type=int, default=20, help="MalwareBazaar samples")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="Padding added to every event and hunting record")
+    parser.add_argument("--sample-bytes", type=int, default=64 * 1024, help="Size of every sample file")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    config = MockConfig(args.events, args.hunting_records, args.samples, args.payload_bytes, args.sample_bytes,
+                        args.latency_ms, args.error_rate)
+    server = MockServer(config, args.host, args.port)
+    print(f"Serving on {server.url}")
+    print(f"  FORTIEDR_HOST={server.url}")
+    print(f"  MB_API_URL={server.url}/api/v1/")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,195 @@
-import os
+import sys
 import json
-import fortiedr
-import pandas as pd
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from tabulate import tabulate
+from itertools import islice
 from dotenv import load_dotenv
+from fortiedr_client import authenticate
+from fortiedr_event_store import EventStore
+from fortiedr_events import PAGE_SIZE, iter_events
+import fortiedr_profile as profile
+from fortiedr_output import STREAM_FORMATS, batched, write_jsonl, write_rows
+from fortiedr_enrichment import activity_summary, enrich_events
+from fortiedr_external_sort import SORT_FIELDS, external_sort, parse_sort
+from fortiedr_schema import Projection
+from fortiedr_tenants import HOST_CONCURRENCY, display_tenant_results, fan_out, load_tenants
 
 # Load environment variables from .env file
 load_dotenv()
 
-def authenticate():
-    """ Authenticate to FortiEDR using credentials from .env """
-    authentication = fortiedr.auth(
-        user=os.getenv("FORTIEDR_USER"),
-        passw=os.getenv("FORTIEDR_PASS"),
-        host=os.getenv("FORTIEDR_HOST"),
-        org=os.getenv("FORTIEDR_ORG")
-    )
+# Fields shown for each event in table, CSV and text output (header, path in the event)
+EVENT_FIELDS = [
+    ("Event ID", ("eventId",)),
+    ("Process", ("process",)),
+    ("First Seen", ("firstSeen",)),
+    ("Last Seen", ("lastSeen",)),
+    ("Classification", ("classification",)),
+    ("Device", ("collectors", 0, "device")),
+    ("Action", ("action",)),
+]
+EVENT_HEADERS = [field[0] for field in EVENT_FIELDS]
+# Organization added first to fan-out results, activity last to enriched events
+TENANT_FIELD = ("Organization", ("organization",))
 
-    if not authentication['status']:
-        print("Authentication failed:", authentication['data'])
-        exit()
+EVENT_PROJECTION = Projection(EVENT_FIELDS)
+TENANT_PROJECTION = Projection([TENANT_FIELD] + EVENT_FIELDS)
 
-    return authentication
+# Date format expected by firstSeenFrom / firstSeenTo
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Initial number of time shards per parallel request in export mode
+SHARDS_PER_REQUEST = 2
+# Poll interval bounds in seconds for watch mode
+WATCH_MIN_INTERVAL = 2
+WATCH_MAX_INTERVAL = 60
+# Seconds re-read before the watch cursor, for events indexed late
+WATCH_OVERLAP = 30
+
+def events_api():
+    """ Authenticate and return the shared FortiEDR client used for the events API """
+    client = authenticate()
+    print("\nAuthentication successful!", file=sys.stderr)
+    return client
+
+def last_window(days=0, hours=0):
+    """ Return the firstSeenFrom / firstSeenTo strings covering the last days or hours """
+    now = datetime.now()
+    return (now - timedelta(days=days, hours=hours)).strftime(TIME_FORMAT), now.strftime(TIME_FORMAT)
+
+def date_window(start_date, end_date):
+    """ Return the firstSeenFrom / firstSeenTo strings covering whole days from start_date to end_date """
+    return f"{start_date} 00:00:00", f"{end_date} 23:59:59"
+
+def split_window(start, end, shards):
+    """ Split the inclusive [start, end] window into contiguous one-second aligned shards """
+    seconds = int((end - start).total_seconds()) + 1
+    shards = max(1, min(shards, seconds))
+    bounds = [start + timedelta(seconds=seconds * i // shards) for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1] - timedelta(seconds=1)) for i in range(shards)]
+
+def fetch_shard(method, params, start, end, page_cap):
+    """ Fetch one shard, returning None when it hits the page cap and should be split """
+    shard_params = dict(params, firstSeenFrom=start.strftime(TIME_FORMAT), firstSeenTo=end.strftime(TIME_FORMAT))
+    data = method.list_events(**shard_params, pageNumber=0, itemsPerPage=page_cap)
+    if not data['status']:
+        print(f"Error in fetching data for {shard_params['firstSeenFrom']} - {shard_params['firstSeenTo']}.", file=sys.stderr)
+        return []
+    if len(data['data']) < page_cap:
+        return data['data']
+    if start < end:
+        return None
+    # A single second cannot be split any further, page through it instead
+    return list(iter_events(method, shard_params, page_size=page_cap))
+
+def export_events(method, firstSeenFrom, firstSeenTo, params=None, max_workers=8, shards=None, page_cap=PAGE_SIZE):
+    """ Fetch a firstSeen window as parallel time shards, yielding each eventId once """
+    start = datetime.strptime(firstSeenFrom, TIME_FORMAT)
+    end = datetime.strptime(firstSeenTo, TIME_FORMAT)
+    params = {k: v for k, v in (params or {}).items() if k not in ("firstSeenFrom", "firstSeenTo")}
+    seen = set()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+
+    def submit(shard_start, shard_end):
+        future = executor.submit(fetch_shard, method, params, shard_start, shard_end, page_cap)
+        pending[future] = (shard_start, shard_end)
+
+    try:
+        for shard_start, shard_end in split_window(start, end, shards or max_workers * SHARDS_PER_REQUEST):
+            submit(shard_start, shard_end)
+
+        while pending:
+            with profile.span("wait_shard"):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard_start, shard_end = pending.pop(future)
+                events = future.result()
+                if events is None:
+                    # The shard was full: split it in two and fetch both halves
+                    for half_start, half_end in split_window(shard_start, shard_end, 2):
+                        submit(half_start, half_end)
+                    continue
+
+                for entry in events:
+                    if entry["eventId"] not in seen:
+                        seen.add(entry["eventId"])
+                        yield entry
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def sync_store(method, store):
+    """ Pull the events seen since the last sync into the local store """
+    params = {"lastSeenTo": datetime.now().strftime(TIME_FORMAT)}
+    high_water_mark = store.high_water_mark()
+    if high_water_mark:
+        params["lastSeenFrom"] = high_water_mark
+
+    # Print the API request in red
+    print("\n\033[91m" + f"API Request: {params}" + "\033[0m\n", file=sys.stderr)
+
+    errors = []
+    with profile.span("store_sync"):
+        count = store.upsert(iter_events(method, params, errors=errors), errors=errors)
+    for error in errors:
+        print("Error in fetching data, the high-water mark was not advanced:", error, file=sys.stderr)
+    print(f"Synced {count} new or updated events to {store.path} (lastSeen high-water mark: {store.high_water_mark()})", file=sys.stderr)
+
+def watch_events(method, action_filter=None, lookback_minutes=5, min_interval=WATCH_MIN_INTERVAL, max_interval=WATCH_MAX_INTERVAL):
+    """ Poll for events seen after a lastSeen cursor and print each new or updated event once as a JSON line """
+    cursor = datetime.now() - timedelta(minutes=lookback_minutes)
+    # eventId -> lastSeen already printed, only kept for the overlap window
+    emitted = {}
+    interval = min_interval
+    print(f"Watching events (polling every {min_interval}-{max_interval}s, Ctrl+C to stop)", file=sys.stderr)
+
+    try:
+        while True:
+            params = {
+                "lastSeenFrom": (cursor - timedelta(seconds=WATCH_OVERLAP)).strftime(TIME_FORMAT),
+                "lastSeenTo": datetime.now().strftime(TIME_FORMAT)
+            }
+            if action_filter:
+                params["actions"] = action_filter
+
+            new_events = 0
+            for entry in iter_events(method, params):
+                last_seen = entry.get("lastSeen") or ""
+                if emitted.get(entry["eventId"]) == last_seen:
+                    continue
+                emitted[entry["eventId"]] = last_seen
+                print(json.dumps(entry), flush=True)
+                new_events += 1
+                if last_seen:
+                    cursor = max(cursor, datetime.strptime(last_seen, TIME_FORMAT))
+
+            horizon = (cursor - timedelta(seconds=WATCH_OVERLAP)).strftime(TIME_FORMAT)
+            emitted = {event_id: last_seen for event_id, last_seen in emitted.items() if last_seen >= horizon}
+
+            # Poll faster while events are arriving, back off while the tenant is quiet
+            interval = max(min_interval, interval / 2) if new_events else min(max_interval, interval * 2)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped watching.", file=sys.stderr)
+
+def get_events(method, firstSeenFrom=None, firstSeenTo=None, action_filter=None, max_items=None, output_format="table", parallel_requests=None, store_mode=None, enrich=False, sort=None):
+    """ Fetch events with optional filters for action type, max items, output format, sharded export, local store, activity enrichment and sort order """
+
+    if store_mode:
+        store = EventStore()
+        if store_mode == "sync":
+            sync_store(method, store)
+        if sort:
+            # The limit keeps the first events of the sorted order, not of the store order
+            events = islice(external_sort(store.query(action_filter, firstSeenFrom, firstSeenTo), *parse_sort(sort)), max_items)
+        else:
+            events = store.query(action_filter, firstSeenFrom, firstSeenTo, max_items)
+        if enrich:
+            events = enrich_events(method, events)
+        display_events(events, output_format, enriched=enrich)
+        store.close()
+        return
 
-def get_events(method, firstSeenFrom=None, firstSeenTo=None, action_filter=None, max_items=None, output_format="table"):
-    """ Fetch events with optional filters for action type, max items per page, and output format """
-    
     params = {}
     
     if firstSeenFrom and firstSeenTo:
@@ -34,76 +197,159 @@ def get_events(method, firstSeenFrom=None, firstSeenTo=None, action_filter=None,
         params["firstSeenTo"] = firstSeenTo
     if action_filter:
         params["actions"] = action_filter
-    if max_items:
-        params["itemsPerPage"] = max_items
     
     # Print the API request in red
-    print("\n\033[91m" + f"API Request: {params}" + "\033[0m\n")
+    print("\n\033[91m" + f"API Request: {params}" + "\033[0m\n", file=sys.stderr)
     
-    data = method.list_events(**params)
-    display_events(data, output_format)
-
-def display_events(data, output_format):
-    """ Display event data in a formatted table or as JSON """
-    if data['status']:
-        if output_format == "json":
-            print(json.dumps(data, indent=2))
-        else:
-            table_data = []
-            for index, entry in enumerate(data["data"], start=1):
-                table_data.append([
-                    index,  # Line number
-                    entry["eventId"],
-                    entry["process"],
-                    entry["firstSeen"],
-                    entry["lastSeen"],
-                    entry["classification"],
-                    entry["collectors"][0]["device"] if entry["collectors"] else "N/A",
-                    entry["action"]
-                ])
-
-            headers = ["#", "Event ID", "Process", "First Seen", "Last Seen", "Classification", "Device", "Action"]
-            df = pd.DataFrame(table_data, columns=headers)
-            print(tabulate(df, headers="keys", tablefmt="fancy_grid", showindex=False))
+    # With a sort order, the limit applies to the sorted events, so every event is fetched first
+    fetch_limit = None if sort else max_items
+    if parallel_requests and firstSeenFrom and firstSeenTo:
+        events = islice(export_events(method, firstSeenFrom, firstSeenTo, params, max_workers=parallel_requests), fetch_limit)
     else:
-        print("Error in fetching data.")
+        events = iter_events(method, params, fetch_limit)
+
+    if sort:
+        # Sorted runs are spilled to disk, so memory stays bounded whatever the export size
+        events = islice(external_sort(events, *parse_sort(sort)), max_items)
+    if enrich:
+        # Grouping by device and time window needs the whole result
+        events = enrich_events(method, events)
+    display_events(events, output_format, enriched=enrich)
+
+def get_tenant_events(inventory_file, firstSeenFrom=None, firstSeenTo=None, action_filter=None, max_items=None, output_format="table", sort=None, timeout=None, host_concurrency=HOST_CONCURRENCY):
+    """ Fetch events from every tenant of the inventory at once, merged into one stream tagged with each event's organization """
+    tenants, host_limits = load_tenants(inventory_file)
+
+    params = {}
+    if firstSeenFrom and firstSeenTo:
+        params["firstSeenFrom"] = firstSeenFrom
+        params["firstSeenTo"] = firstSeenTo
+    if action_filter:
+        params["actions"] = action_filter
+
+    # Print the API request in red
+    print("\n\033[91m" + f"API Request: {params} on {len(tenants)} tenants" + "\033[0m\n", file=sys.stderr)
+
+    results = []
+    # max_items applies to each tenant, so one large tenant cannot crowd out the others; with a sort order it applies to the merged result
+    fetch_limit = None if sort else max_items
+    pages = fan_out(
+        tenants,
+        lambda client, errors: batched(iter_events(client, params, fetch_limit, errors=errors), PAGE_SIZE),
+        lambda entry, tenant: dict(entry, organization=tenant["name"]),
+        host_concurrency=host_concurrency, host_limits=host_limits, timeout=timeout, results=results
+    )
+    events = (entry for page in pages for entry in page)
+    if sort:
+        events = islice(external_sort(events, *parse_sort(sort)), max_items)
+    display_events(events, output_format, tenants=True)
+    display_tenant_results(results)
+
+def event_rows(page, tenants=False, enriched=False):
+    """ Project a page of events onto the displayed fields """
+    rows = (TENANT_PROJECTION if tenants else EVENT_PROJECTION).rows(page)
+    if enriched:
+        for row, entry in zip(rows, page):
+            row.append(activity_summary(entry))
+    return rows
+
+def display_events(events, output_format, batch_size=PAGE_SIZE, enriched=False, tenants=False):
+    """ Display events as they arrive, in formatted tables, as JSON, or streamed as JSON lines, CSV or text """
+    # Enriched events show their activity summary as an extra column, fan-out results their organization first
+    headers = (["Organization"] if tenants else []) + EVENT_HEADERS + (["Activity"] if enriched else [])
+
+    if output_format == "jsonl":
+        write_jsonl(batched(events, batch_size))
+        return
+    if output_format in STREAM_FORMATS:
+        write_rows((event_rows(page, tenants, enriched) for page in batched(events, batch_size)), headers, output_format)
+        return
+
+    if output_format == "json":
+        # Keep the {"status": ..., "data": [...]} layout without holding all events
+        print('{\n  "status": true,\n  "data": [', end="")
+        index = 0
+        for batch in batched(events, batch_size):
+            with profile.span("render_json"):
+                for entry in batch:
+                    body = json.dumps(entry, indent=2).replace("\n", "\n    ")
+                    print(("," if index else "") + "\n    " + body, end="")
+                    index += 1
+                sys.stdout.flush()
+            profile.count("events_displayed", len(batch))
+        print("\n  ]\n}")
+        return
+
+    with profile.span("import_pandas"):
+        import pandas as pd
+        from tabulate import tabulate
+
+    headers = ["#"] + headers
+    index = 0
+    # One table per page, so the first rows show up after a single round-trip
+    for batch in batched(events, batch_size):
+        with profile.span("build_rows"):
+            table_data = [[index + line] + row for line, row in enumerate(event_rows(batch, tenants, enriched), start=1)]  # Line number first
+        index += len(batch)
+
+        with profile.span("dataframe"):
+            df = pd.DataFrame(table_data, columns=headers)
+        with profile.span("tabulate"):
+            table = tabulate(df, headers="keys", tablefmt="fancy_grid", showindex=False)
+        with profile.span("print"):
+            print(table, flush=True)
+        profile.count("events_displayed", len(batch))
 
 def main():
     """ Main function to execute authentication and event retrieval """
-    authentication = authenticate()
-    print("\nAuthentication successful!")
+    method = events_api()
 
-    method = fortiedr.Events()
-
-    output_format = input("\nDo you want the raw JSON output or table format? (default: table): ").strip().lower() or "table"
+    output_format = input("\nOutput format: json, table, jsonl, csv or text? (default: table): ").strip().lower() or "table"
 
     max_items = input("\nEnter max number of items to display (or press Enter for no limit): ").strip()
     max_items = int(max_items) if max_items.isdigit() else None
     
     action_filter = input("\nEnter action filter (Block, SimulationBlock, Log) or press Enter for no filter: ").strip() or None
 
+    parallel_requests = input("\nEnter number of parallel requests for a sharded export (or press Enter for a single query): ").strip()
+    parallel_requests = int(parallel_requests) if parallel_requests.isdigit() else None
+
+    store_mode = input("\nUse the local event store? (y = sync then query, o = offline, press Enter to query the API): ").strip().lower()
+    store_mode = {"y": "sync", "o": "offline"}.get(store_mode)
+
+    enrich = input("\nAttach the surrounding threat-hunting activity to each event? (y/N): ").strip().lower() == "y"
+
+    sort = input("\nSort by firstSeen, lastSeen or eventId (prefix with - for descending), or press Enter for API order: ").strip() or None
+    if sort and parse_sort(sort)[0] not in SORT_FIELDS:
+        print(f"\nCannot sort on '{sort}', keeping the API order.")
+        sort = None
+
     print("\nChoose an option:")
     print("1 - Last N days")
     print("2 - Last X hours")
     print("3 - Custom date range")
-    choice = input("\nEnter your choice (1/2/3): ")
+    print("4 - Watch for new events (JSON lines)")
+    choice = input("\nEnter your choice (1/2/3/4): ")
     
     if choice == "1":
         days = int(input("\nEnter the number of days: "))
-        get_events(method, (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S"), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action_filter, max_items, output_format)
+        get_events(method, *last_window(days=days), action_filter, max_items, output_format, parallel_requests, store_mode, enrich, sort)
 
     elif choice == "2":
         hours = int(input("\nEnter the number of hours: "))
-        get_events(method, (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S"), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action_filter, max_items, output_format)
+        get_events(method, *last_window(hours=hours), action_filter, max_items, output_format, parallel_requests, store_mode, enrich, sort)
 
     elif choice == "3":
         start_date = input("\nEnter start date (YYYY-MM-DD): ")
         end_date = input("\nEnter end date (YYYY-MM-DD): ")
-        get_events(method, f"{start_date} 00:00:00", f"{end_date} 23:59:59", action_filter, max_items, output_format)
+        get_events(method, *date_window(start_date, end_date), action_filter, max_items, output_format, parallel_requests, store_mode, enrich, sort)
+
+    elif choice == "4":
+        watch_events(method, action_filter)
 
     else:
         print("\nNo date filter applied. Fetching all available events.")
-        get_events(method, action_filter=action_filter, max_items=max_items, output_format=output_format)
+        get_events(method, action_filter=action_filter, max_items=max_items, output_format=output_format, store_mode=store_mode, enrich=enrich, sort=sort)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -49,19 +49,34 @@ FILTERS=("Block" "SimulationBlock" "Log")
 RED='\033[0;31m'
 NC='\033[0m' # No color
 
-# Loop through each filter and execute the request
+# Fetch every filter in a single curl invocation so the TLS connection is opened once and reused.
+# --retry covers timeouts, 429 and 5xx responses with exponential backoff.
+TMP_DIR=$(mktemp -d)
+trap 'rm -rf "${TMP_DIR}"' EXIT
+
+CURL_ARGS=()
+for action in "${FILTERS[@]}"; do
+    CURL_ARGS+=(-o "${TMP_DIR}/${action}.json" "${API_URL}?itemsPerPage=1&actions=${action}")
+done
+
+# Construct the curl request (masked for display)
+CURL_CMD="curl -s --retry 5 --retry-max-time 60 -H \"Authorization: Basic ${MASKED_AUTH_TOKEN}\""
+for action in "${FILTERS[@]}"; do
+    CURL_CMD+=" \"${API_URL}?itemsPerPage=1&actions=${action}\""
+done
+
+echo "Full CURL request:"
+echo "${CURL_CMD}"
+
+# Execute the actual request with the real token
+curl -s --retry 5 --retry-max-time 60 -H "Authorization: Basic ${AUTH_TOKEN}" "${CURL_ARGS[@]}"
+
+# Display the response of each filter
 for action in "${FILTERS[@]}"; do
     echo -e "\n----------------------------------------"
     echo "Filter used: actions=${action}"
-    
-    # Construct the curl request (masked for display)
-    CURL_CMD="curl -s -H \"Authorization: Basic ${MASKED_AUTH_TOKEN}\" \"${API_URL}?itemsPerPage=1&actions=${action}\""
-    
-    echo "Full CURL request:"
-    echo "${CURL_CMD}"
-    
-    # Execute the actual request with the real token
-    RESPONSE=$(curl -s -H "Authorization: Basic ${AUTH_TOKEN}" "${API_URL}?itemsPerPage=1&actions=${action}")
+
+    RESPONSE=$(cat "${TMP_DIR}/${action}.json" 2>/dev/null)
 
     # Check if the response contains an error message
     if echo "${RESPONSE}" | jq empty 2>/dev/null; then
@@ -1,51 +1,207 @@
 import os
+import re
+import sys
 import json
-import fortiedr
-import pandas as pd
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from tabulate import tabulate
 from dotenv import load_dotenv
+from fortiedr_client import authenticate
+import fortiedr_profile as profile
+from fortiedr_output import STREAM_FORMATS, write_jsonl, write_rows
+from fortiedr_hunt_cache import DEFAULT_TTL as HUNT_CACHE_TTL, HuntCache
+from fortiedr_schema import Projection
+from fortiedr_tenants import HOST_CONCURRENCY, display_tenant_results, fan_out, load_tenants
 
 # Load environment variables from .env file
 load_dotenv()
 
-def authenticate():
-    """ Authenticate to FortiEDR using credentials from .env """
-    authentication = fortiedr.auth(
-        user=os.getenv("FORTIEDR_USER"),
-        passw=os.getenv("FORTIEDR_PASS"),
-        host=os.getenv("FORTIEDR_HOST"),
-        org=os.getenv("FORTIEDR_ORG")
-    )
+# Number of records requested per page when exporting to a columnar file
+PAGE_SIZE = 1000
+# Number of batch queries running at the same time
+BATCH_CONCURRENCY = 4
+# Batch query names, also used as file names in the output directory
+QUERY_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
 
-    if not authentication['status']:
-        print("Authentication failed:", authentication['data'])
-        exit()
+# Flattened Source/Target/Device fields written to Parquet / Arrow (column name, path in the record)
+COLUMNS = [
+    ("Time", ("Time",)),
+    ("ID", ("ID",)),
+    ("Category", ("Category",)),
+    ("Type", ("Type",)),
+    ("Device.Name", ("Device", "Name")),
+    ("Device.OS", ("Device", "OS")),
+    ("Device.OSVersion", ("Device", "OSVersion")),
+    ("Device.CollectorVersion", ("Device", "CollectorVersion")),
+    ("Source.Process.Name", ("Source", "Process", "Name")),
+    ("Source.Process.Path", ("Source", "Process", "Path")),
+    ("Source.Process.CommandLine", ("Source", "Process", "CommandLine")),
+    ("Source.Process.User.Username", ("Source", "Process", "User", "Username")),
+    ("Target.File.Path", ("Target", "File", "Path")),
+    ("Target.Process.Name", ("Target", "Process", "Name")),
+    ("Target.Registry.Path", ("Target", "Registry", "Path")),
+    ("Target.Network.RemoteIP", ("Target", "Network", "RemoteIP")),
+    ("Target.Network.RemotePort", ("Target", "Network", "RemotePort")),
+]
 
-    return authentication
+# Low-cardinality columns stored as dictionaries instead of repeated strings
+DICTIONARY_COLUMNS = {"Category", "Type", "Device.Name", "Device.OS", "Source.Process.Name", "Source.Process.User.Username"}
 
-def main():
-    """ Main function to execute authentication and event retrieval """
-    authentication = authenticate()
-    print("\nAuthentication successful!")
+# Dimensions counted by the summary mode (label, path in the record)
+AGGREGATIONS = [
+    ("Device", ("Device", "Name")),
+    ("Process", ("Source", "Process", "Name")),
+    ("Type", ("Type",)),
+    ("User", ("Source", "Process", "User", "Username")),
+    ("Hour", ("Time",)),
+]
+# Number of top keys displayed per dimension
+TOP_N = 10
 
-    method = fortiedr.ThreatHunting()
+# Fields shown for each record in table, CSV and text output (header, path in the record, kind)
+HUNTING_FIELDS = [
+    ("Time", ("Time",), "time"),
+    ("Type", ("Type",)),
+    ("Device Name", ("Device", "Name")),
+    ("Process Name", ("Source", "Process", "Name")),
+    ("Command Line", ("Source", "Process", "CommandLine")),
+    ("Target Path", ("Target", "File", "Path")),
+    ("User", ("Source", "Process", "User", "Username")),
+]
+HUNTING_HEADERS = [field[0] for field in HUNTING_FIELDS]
+# Organization added first to fan-out results
+TENANT_FIELD = ("Organization", ("Organization",))
 
-    # Ask user for preferences with improved formatting
-    output_format = input("\nDo you want the raw JSON output or table format? (default: table): ").strip().lower() or "table"
-    max_items = input("\nEnter max number of items to display (or press Enter for no limit): ").strip()
-    max_items = int(max_items) if max_items.isdigit() else None
-    category = input("\nEnter the category (Process, File, Registry, Network, Event Log, All) (default: no category): ").strip()
-    
-    time_period = input("\nEnter the time period (lastHour, last12hours, last24hours, last7days, last30days, custom) (default: no time period): ").strip()
+HUNTING_PROJECTION = Projection(HUNTING_FIELDS)
+TENANT_PROJECTION = Projection([TENANT_FIELD] + HUNTING_FIELDS)
 
-    # Initialize from_time only if custom time period is chosen
-    from_time = ""
-    if time_period.lower() == "custom":
-        from_time = input("\nEnter the start date (yyyy-MM-dd): ").strip()
+def hunting_api():
+    """ Authenticate and return the shared FortiEDR client used for the threat-hunting API """
+    client = authenticate()
+    print("\nAuthentication successful!", file=sys.stderr)
+    return client
 
-    # Prepare search parameters
+def iter_hunting_pages(method, search_params, max_items=None, page_size=PAGE_SIZE, errors=None):
+    """ Yield threat-hunting results one page at a time, failures are printed or added to errors """
+    if max_items:
+        page_size = min(page_size, max_items)
+    remaining = max_items
+    page_number = 0
+
+    while True:
+        data = method.search(**search_params, pageNumber=page_number, itemsPerPage=page_size)
+        if not data['status']:
+            if errors is None:
+                print("Failed to retrieve data:", data, file=sys.stderr)
+            else:
+                errors.append(data['data'])
+            return
+
+        page = data['data']
+        if remaining is not None:
+            page = page[:remaining]
+            remaining -= len(page)
+        if page:
+            yield page
+        if len(data['data']) < page_size or remaining == 0:
+            return
+        page_number += 1
+
+def write_columnar(pages, output_file, output_format, columns=COLUMNS):
+    """ Write flattened records to Parquet or an Arrow IPC stream, one record batch per page """
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        print("Parquet and Arrow output require pyarrow: pip install pyarrow")
+        return
+
+    fields = []
+    for name, _ in columns:
+        if name == "Time":
+            fields.append(pa.field(name, pa.timestamp("ms")))
+        elif name in DICTIONARY_COLUMNS:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    schema = pa.schema(fields)
+
+    if output_format == "parquet":
+        writer = pa.parquet.ParquetWriter(output_file, schema, use_dictionary=sorted(DICTIONARY_COLUMNS))
+    else:
+        # The IPC stream format allows each page to carry its own dictionaries
+        writer = pa.ipc.new_stream(output_file, schema)
+
+    projection = Projection(columns)
+    total = 0
+    with writer:
+        for page in pages:
+            with profile.span("columnar_arrays"):
+                arrays = []
+                for (name, values), field in zip(projection.columns(page).items(), fields):
+                    if name == "Time":
+                        arrays.append(pa.array(values, type=field.type))
+                        continue
+                    values = [None if value is None else str(value) for value in values]
+                    if name in DICTIONARY_COLUMNS:
+                        arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+                    else:
+                        arrays.append(pa.array(values, type=pa.string()))
+            with profile.span("columnar_write"):
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+            total += len(page)
+            profile.count("records_exported", len(page))
+            print(f"Wrote {total} records to {output_file}", end="\r", flush=True)
+
+    print(f"\nExported {total} records to {output_file} ({output_format})")
+
+def aggregate(pages, aggregations=AGGREGATIONS):
+    """ Count records per device, process, type, user and hour, one page at a time """
+    import pandas as pd
+
+    projection = Projection(aggregations)
+    counters = {label: Counter() for label, _ in aggregations}
+    total = 0
+    for page in pages:
+        with profile.span("dataframe"):
+            frame = pd.DataFrame(projection.columns(page))
+        with profile.span("aggregate"):
+            # Epoch milliseconds truncated to the hour, labelled when displayed
+            frame["Hour"] = pd.to_numeric(frame["Hour"], errors="coerce") // 3600000 * 3600000
+            for label, counter in counters.items():
+                counter.update(frame[label].dropna().value_counts().to_dict())
+                counter["N/A"] += int(frame[label].isna().sum())
+        total += len(page)
+        profile.count("records_aggregated", len(page))
+        print(f"Aggregated {total} records", end="\r", flush=True)
+
+    for counter in counters.values():
+        if not counter["N/A"]:
+            del counter["N/A"]
+    return total, counters
+
+def display_summary(total, counters, top_n=TOP_N):
+    """ Display the top keys of every aggregated dimension """
+    from tabulate import tabulate
+
+    print(f"\nSummary of {total} records")
+    for label, counter in counters.items():
+        rows = []
+        for key, count in counter.most_common(top_n):
+            if label == "Hour" and key != "N/A":
+                key = datetime.fromtimestamp(key / 1000).strftime('%Y-%m-%d %H:00')
+            rows.append([key, count, f"{100 * count / total:.1f}%" if total else "-"])
+        print(f"\nTop {label} ({len(counter)} distinct)")
+        with profile.span("tabulate"):
+            table = tabulate(rows, headers=[label, "Records", "Share"], tablefmt="fancy_grid")
+        print(table)
+
+def build_search_params(max_items=None, category=None, time_period=None, from_time=None):
+    """ Build the threat-hunting search parameters from the user choices """
     search_params = {}
+    time_period = time_period or ""
 
     if max_items:
         search_params['itemsPerPage'] = int(max_items)
@@ -57,47 +213,225 @@ def main():
     elif time_period and time_period.lower() != "custom":
         search_params['time'] = time_period  # Use predefined time periods only
 
+    return search_params
+
+def search_pages(method, search_params, max_items=None, cache=None, refresh=False):
+    """ Pages of a search, answered from the result cache when it holds a fresh copy """
+    if cache is None:
+        return iter_hunting_pages(method, search_params, max_items)
+
+    key, params, expires = cache.key(method, search_params, max_items)
+    pages = None if refresh else cache.get(key)
+    if pages is not None:
+        print(f"Served {sum(len(page) for page in pages)} records from the result cache ({cache.path})", file=sys.stderr)
+        return iter(pages)
+
+    errors = []
+
+    def fetch():
+        yield from cache.cached_pages(key, params, expires, iter_hunting_pages(method, search_params, max_items, errors=errors), errors)
+        for error in errors:
+            print("Failed to retrieve data:", error, file=sys.stderr)
+    return fetch()
+
+def search_once(method, search_params, cache=None, refresh=False):
+    """ Single search request, answered from the result cache when it holds a fresh copy """
+    if cache is None:
+        return method.search(**search_params)
+
+    key, params, expires = cache.key(method, search_params, mode="single")
+    pages = None if refresh else cache.get(key)
+    if pages is not None:
+        print(f"Served {len(pages[0])} records from the result cache ({cache.path})", file=sys.stderr)
+        return {"status": True, "data": pages[0]}
+
+    data = method.search(**search_params)
+    if data['status']:
+        cache.put(key, params, expires, [data['data']])
+    return data
+
+def run_search(method, search_params, output_format="table", max_items=None, output_file=None, top_n=TOP_N, cache=None, refresh=False):
+    """ Perform the search and display or export the results, through the result cache when one is given """
     # Print the API request in red
-    print("\n\033[91m" + f"API Request: {search_params}" + "\033[0m\n")
+    print("\n\033[91m" + f"API Request: {search_params}" + "\033[0m\n", file=sys.stderr)
+
+    if output_file:
+        # Page through every result, itemsPerPage is driven by the pager
+        search_params = {k: v for k, v in search_params.items() if k != 'itemsPerPage'}
+        write_columnar(search_pages(method, search_params, max_items, cache, refresh), output_file, output_format)
+        return
+
+    if output_format == "summary":
+        # Counters only hold distinct keys, so every page can be summarized
+        search_params = {k: v for k, v in search_params.items() if k != 'itemsPerPage'}
+        display_summary(*aggregate(search_pages(method, search_params, max_items, cache, refresh)), top_n)
+        return
+
+    if output_format in STREAM_FORMATS:
+        # Each page is written as soon as it arrives
+        search_params = {k: v for k, v in search_params.items() if k != 'itemsPerPage'}
+        pages = search_pages(method, search_params, max_items, cache, refresh)
+        if output_format == "jsonl":
+            write_jsonl(pages)
+        else:
+            write_rows((HUNTING_PROJECTION.rows(page) for page in pages), HUNTING_HEADERS, output_format)
+        return
 
     # Perform the search
-    data = method.search(**search_params)
+    data = search_once(method, search_params, cache, refresh)
+    display_results(data, output_format)
+
+def run_tenant_search(inventory_file, search_params, output_format="table", max_items=None, output_file=None, top_n=TOP_N, timeout=None, host_concurrency=HOST_CONCURRENCY):
+    """ Run the search on every tenant of the inventory at once, merged into one stream tagged with each record's organization """
+    tenants, host_limits = load_tenants(inventory_file)
+    search_params = {k: v for k, v in search_params.items() if k != 'itemsPerPage'}
+
+    # Print the API request in red
+    print("\n\033[91m" + f"API Request: {search_params} on {len(tenants)} tenants" + "\033[0m\n", file=sys.stderr)
+
+    results = []
+    # max_items applies to each tenant, so one large tenant cannot crowd out the others
+    pages = fan_out(
+        tenants,
+        lambda client, errors: iter_hunting_pages(client, search_params, max_items, errors=errors),
+        lambda record, tenant: dict(record, Organization=tenant["name"]),
+        host_concurrency=host_concurrency, host_limits=host_limits, timeout=timeout, results=results
+    )
+
+    if output_file:
+        write_columnar(pages, output_file, output_format, [TENANT_FIELD] + COLUMNS)
+    elif output_format == "summary":
+        display_summary(*aggregate(pages, [TENANT_FIELD] + AGGREGATIONS), top_n)
+    elif output_format == "jsonl":
+        write_jsonl(pages)
+    elif output_format in STREAM_FORMATS:
+        write_rows((TENANT_PROJECTION.rows(page) for page in pages), TENANT_PROJECTION.names, output_format)
+    else:
+        # Table and JSON show the merged result at once, like a single-tenant search
+        data = {"status": True, "data": [record for page in pages for record in page]}
+        display_results(data, output_format, tenants=True)
+    display_tenant_results(results)
 
+def display_results(data, output_format, tenants=False):
+    """ Display search results in a formatted table or as JSON """
     if data['status']:
         if output_format == "json":
             # Print raw JSON output
-            print(json.dumps(data, indent=2))
+            with profile.span("render_json"):
+                print(json.dumps(data, indent=2))
         else:
-            # Extract relevant fields for table format
-            table_data = []
-            for index, event in enumerate(data['data'], start=1):
-                source_process = event['Source'].get('Process', {})
-                command_line = source_process.get('CommandLine', 'N/A')
-                user_info = source_process.get('User', {})
-                username = user_info.get('Username', 'N/A')
-                target_path = event['Target'].get('File', {}).get('Path', 'N/A')
-
-                table_data.append([
-                    index,  # Line number
-                    datetime.fromtimestamp(event['Time'] / 1000).strftime('%Y-%m-%d %H:%M:%S'),
-                    event['Type'],
-                    event['Device']['Name'],
-                    source_process.get('Name', 'N/A'),
-                    command_line,
-                    target_path,
-                    username
-                ])
-
-            # Define headers for the table
-            headers = ["#", "Time", "Type", "Device Name", "Process Name", "Command Line", "Target Path", "User"]
-
-            # Create a DataFrame
-            df = pd.DataFrame(table_data, columns=headers)
+            with profile.span("import_pandas"):
+                import pandas as pd
+                from tabulate import tabulate
+
+            # Only the displayed fields are read, one column per field for the whole page
+            projection = TENANT_PROJECTION if tenants else HUNTING_PROJECTION
+            with profile.span("build_rows"):
+                columns = projection.columns(data['data'])
+
+            # Create a DataFrame, line number first
+            with profile.span("dataframe"):
+                df = pd.DataFrame({"#": range(1, len(data['data']) + 1), **columns}).fillna("N/A")
 
             # Display formatted table output in terminal
-            print(tabulate(df, headers="keys", tablefmt="fancy_grid", showindex=False))
+            with profile.span("tabulate"):
+                table = tabulate(df, headers="keys", tablefmt="fancy_grid", showindex=False)
+            with profile.span("print"):
+                print(table)
     else:
         print("Failed to retrieve data:", data)
 
+def load_batch(batch_file):
+    """ Load named queries: {"name": {search parameters, optional "maxItems"}, ...} """
+    with open(batch_file) as f:
+        queries = json.load(f)
+    for name in queries:
+        if not QUERY_NAME.fullmatch(name):
+            raise ValueError(f"{batch_file}: query name '{name}' must only use letters, digits, '.', '_' and '-', and start with a letter or digit")
+    return queries
+
+def run_query(method, name, query, output_dir):
+    """ Run one named query, streaming its records to <output_dir>/<name>.json """
+    search_params = {k: v for k, v in query.items() if k not in ("maxItems", "itemsPerPage")}
+    output_file = os.path.join(output_dir, f"{name}.json")
+    errors = []
+    count = 0
+    started = time.perf_counter()
+
+    with open(output_file, "w") as f:
+        f.write(json.dumps({"name": name, "params": search_params})[:-1] + ', "data": [')
+        try:
+            for page in iter_hunting_pages(method, search_params, query.get("maxItems"), errors=errors):
+                with profile.span("write_json"):
+                    for record in page:
+                        f.write(("," if count else "") + "\n" + json.dumps(record))
+                        count += 1
+        except Exception as e:
+            # A connection error or exhausted retries fail this query only, the file stays valid JSON
+            errors.append(str(e))
+        finally:
+            seconds = time.perf_counter() - started
+            f.write(f'\n], "count": {count}, "seconds": {seconds:.3f}, "errors": {json.dumps(errors, default=str)}}}\n')
+
+    return {"name": name, "count": count, "seconds": seconds, "status": "failed" if errors else "ok", "file": output_file}
+
+def run_batch(method, batch_file, output_dir="hunting-results", max_workers=BATCH_CONCURRENCY):
+    """ Run every named query of a batch file concurrently over the same authenticated session """
+    from tabulate import tabulate
+
+    queries = load_batch(batch_file)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"\nRunning {len(queries)} queries from {batch_file} ({max_workers} at a time)\n")
+
+    started = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_query, method, name, query, output_dir) for name, query in queries.items()]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"{result['name']}: {result['count']} records in {result['seconds']:.2f}s ({result['status']})")
+            results.append(result)
+
+    rows = [[r["name"], r["status"], r["count"], f"{r['seconds']:.2f}", r["file"]] for r in sorted(results, key=lambda r: r["name"])]
+    print()
+    print(tabulate(rows, headers=["Query", "Status", "Records", "Seconds", "Output"], tablefmt="fancy_grid"))
+    print(f"\nBatch completed in {time.perf_counter() - started:.2f}s")
+
+def main():
+    """ Main function to execute authentication and event retrieval """
+    method = hunting_api()
+
+    batch_file = input("\nEnter a batch file of named queries (or press Enter for a single search): ").strip()
+    if batch_file:
+        run_batch(method, batch_file)
+        return
+
+    # Ask user for preferences with improved formatting
+    output_format = input("\nOutput format: json, table, summary, parquet, arrow, jsonl, csv or text? (default: table): ").strip().lower() or "table"
+    output_file = None
+    if output_format in ("parquet", "arrow"):
+        default_file = "threat-hunting.parquet" if output_format == "parquet" else "threat-hunting.arrows"
+        output_file = input(f"\nEnter the output file (default: {default_file}): ").strip() or default_file
+    max_items = input("\nEnter max number of items to display (or press Enter for no limit): ").strip()
+    max_items = int(max_items) if max_items.isdigit() else None
+    category = input("\nEnter the category (Process, File, Registry, Network, Event Log, All) (default: no category): ").strip()
+    
+    time_period = input("\nEnter the time period (lastHour, last12hours, last24hours, last7days, last30days, custom) (default: no time period): ").strip()
+
+    # Initialize from_time only if custom time period is chosen
+    from_time = ""
+    if time_period.lower() == "custom":
+        from_time = input("\nEnter the start date (yyyy-MM-dd): ").strip()
+
+    cache_mode = input("\nReuse cached results of the same search? (Y = use the cache, r = refresh it, n = bypass it): ").strip().lower()
+    cache = None if cache_mode == "n" else HuntCache()
+
+    # Prepare search parameters
+    search_params = build_search_params(max_items, category, time_period, from_time)
+
+    run_search(method, search_params, output_format, max_items, output_file, cache=cache, refresh=cache_mode == "r")
+    if cache:
+        cache.close()
+
 if __name__ == "__main__":
     main()
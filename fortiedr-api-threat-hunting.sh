@@ -37,7 +37,8 @@ fi
 REQUEST_BODY+=" }"
 
 # Display curl command in a single line
-CURL_COMMAND="curl -s -X POST -H \"Authorization: Basic ${AUTH_TOKEN}\" -H \"Content-Type: application/json\" -d '${REQUEST_BODY}' \"${API_URL}\""
+# --retry covers timeouts, 429 and 5xx responses with exponential backoff
+CURL_COMMAND="curl -s --retry 5 --retry-max-time 60 -X POST -H \"Authorization: Basic ${AUTH_TOKEN}\" -H \"Content-Type: application/json\" -d '${REQUEST_BODY}' \"${API_URL}\""
 
 echo -e "\n$CURL_COMMAND\n"
 
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+import time
+
+# Taken before any other import so the startup check covers the whole cold start
+START_TIME = time.perf_counter()
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Script implementing each subcommand
+SCRIPTS = {
+    "events": "fortiedr-api-list-events.py",
+    "hunt": "fortiedr-api-threat-hunting.py",
+    "malware-list": "fortiedr-malware-list.py",
+    "malware-download": "fortiedr-malware-downloader.py",
+    "mitre": "fortiedr-mitre.py",
+}
+
+# Modules that must only be imported on the code paths that use them
+HEAVY_MODULES = ["pandas", "numpy", "tabulate", "requests", "pyzipper", "pyarrow", "curses"]
+
+# Default cold-start budget for one invocation, interpreter start included
+STARTUP_BUDGET_MS = 300
+
+def load_script(command):
+    """ Import the script behind a subcommand without running its main() """
+    filename = SCRIPTS[command]
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    if name in sys.modules:
+        return sys.modules[name]
+
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def run_events(args):
+    """ events: list FortiEDR events """
+    script = load_script("events")
+
+    if args.days:
+        first_seen_from, first_seen_to = script.last_window(days=args.days)
+    elif args.hours:
+        first_seen_from, first_seen_to = script.last_window(hours=args.hours)
+    elif args.start_date and args.end_date:
+        first_seen_from, first_seen_to = script.date_window(args.start_date, args.end_date)
+    else:
+        first_seen_from, first_seen_to = None, None
+
+    if args.watch:
+        script.watch_events(script.events_api(), args.action, min_interval=args.min_interval, max_interval=args.max_interval)
+        return
+
+    if args.tenants:
+        script.get_tenant_events(args.tenants, first_seen_from, first_seen_to, args.action, args.max_items, args.format, args.sort, args.tenant_timeout, args.per_host)
+        return
+
+    # The offline store answers locally, without authenticating
+    method = None if args.store == "offline" and not args.enrich else script.events_api()
+    script.get_events(method, first_seen_from, first_seen_to, args.action, args.max_items, args.format, args.parallel, args.store, args.enrich, args.sort)
+
+def run_hunt(args):
+    """ hunt: threat-hunting search """
+    script = load_script("hunt")
+    output_file = args.output
+    if args.format in ("parquet", "arrow") and not output_file:
+        output_file = "threat-hunting.parquet" if args.format == "parquet" else "threat-hunting.arrows"
+
+    if args.clear_cache:
+        cache = script.HuntCache()
+        stats = cache.stats()
+        cache.clear()
+        cache.close()
+        print(f"Removed {stats['results']} cached results ({stats['bytes']} bytes) from {cache.path}")
+        return
+
+    if (args.tenants or args.batch) and (args.no_cache or args.refresh or args.cache_ttl is not None):
+        # Fan-out and batch searches always query the servers, so the cache flags would be silently ignored
+        sys.exit("--no-cache, --refresh and --cache-ttl cannot be combined with --tenants or --batch")
+
+    if args.tenants:
+        search_params = script.build_search_params(args.max_items, args.category, args.time, args.from_date)
+        script.run_tenant_search(args.tenants, search_params, args.format, args.max_items, output_file, args.top, args.tenant_timeout, args.per_host)
+        return
+
+    method = script.hunting_api()
+    if args.batch:
+        script.run_batch(method, args.batch, args.output_dir, args.concurrency)
+        return
+
+    cache = None if args.no_cache else script.HuntCache(ttl=args.cache_ttl or script.HUNT_CACHE_TTL)
+    search_params = script.build_search_params(args.max_items, args.category, args.time, args.from_date)
+    script.run_search(method, search_params, args.format, args.max_items, output_file, args.top, cache, args.refresh)
+    if cache:
+        cache.close()
+
+def run_malware_list(args):
+    """ malware-list: recent MalwareBazaar samples """
+    load_script("malware-list").main()
+
+def run_malware_mirror(args):
+    """ malware-mirror: refresh, poll or query the local MalwareBazaar catalog """
+    from fortiedr_bazaar_mirror import BazaarMirror
+
+    mirror = BazaarMirror(ttl=args.ttl)
+    if args.poll:
+        mirror.poll_forever(args.poll)
+        return
+
+    count = mirror.refresh(force=not (args.tag or args.file_type or args.signature))
+    if count:
+        print(f"Merged {count} recent samples into {mirror.path}")
+    for sample in mirror.lookup(args.tag, args.file_type, args.signature, args.limit):
+        print(f"{sample['sha256_hash']}  {sample.get('file_type')}  {sample.get('signature')}  {', '.join(sample.get('tags') or [])}")
+
+def run_malware_download(args):
+    """ malware-download: download samples by tag and/or file type """
+    script = load_script("malware-download")
+    if args.cached_tag:
+        script.list_cached(args.cached_tag)
+        return
+
+    num_samples = min(args.samples, script.MAX_SAMPLES)
+    hashes = script.fetch_hashes(args.tag or "", args.file_type or "", num_samples)
+    if hashes is None:
+        sys.exit(1)
+    script.download(hashes, args.concurrency)
+
+def run_coverage(args):
+    """ coverage: which MalwareBazaar samples FortiEDR blocked, detected or missed """
+    import fortiedr_coverage as coverage
+    import fortiedr_profile as profile
+    from fortiedr_output import write_jsonl, write_rows
+
+    events_script = load_script("events")
+    hunt_script = load_script("hunt")
+    if args.days:
+        window = events_script.last_window(days=args.days)
+    elif args.hours:
+        window = events_script.last_window(hours=args.hours)
+    elif args.start_date and args.end_date:
+        window = events_script.date_window(args.start_date, args.end_date)
+    else:
+        sys.exit("coverage needs a test window: --days, --hours or --from/--to")
+
+    samples = []
+    if args.tag or args.file_type:
+        hashes = load_script("malware-download").fetch_hashes(args.tag or "", args.file_type or "", args.samples)
+        samples.extend(hashes or [])
+    if args.stored_tag:
+        from fortiedr_sample_store import SampleStore
+
+        samples.extend((s["sha256"], [args.stored_tag], s["file_type_mime"], s["added"]) for s in SampleStore().by_tag(args.stored_tag))
+    if args.hashes:
+        with open(args.hashes) as f:
+            samples.extend((line.split()[0], [], None) for line in f if line.strip() and not line.startswith("#"))
+    if not samples:
+        sys.exit("No samples to check: give --tag / --file-type, --stored-tag or --hashes")
+
+    index = coverage.sample_index(samples, started=window[0])
+    print(f"Checking {len(index)} samples against FortiEDR telemetry from {window[0]} to {window[1]}", file=sys.stderr)
+
+    method = events_script.events_api()
+    with profile.span("coverage_events"):
+        matched = coverage.match_events(index, events_script.iter_events(method, {"firstSeenFrom": window[0], "firstSeenTo": window[1]}))
+    print(f"{matched} events matched a sample", file=sys.stderr)
+    if not args.skip_hunting:
+        search_params = {"category": "File", "time": "custom", "fromTime": window[0], "toTime": window[1]}
+        with profile.span("coverage_hunting"):
+            matched = coverage.match_hunting(index, hunt_script.iter_hunting_pages(method, search_params))
+        print(f"{matched} threat-hunting File records matched a sample", file=sys.stderr)
+
+    results = coverage.coverage_rows(index)
+    summary = coverage.summarize(results)
+    if args.format == "json":
+        print(json.dumps({"summary": summary, "samples": results}, indent=2))
+    elif args.format == "jsonl":
+        write_jsonl([results])
+    elif args.format in ("csv", "text"):
+        # Full-width text columns, so the SHA256 can still be copied or joined on
+        write_rows([[coverage.coverage_row(result) for result in results]], coverage.COVERAGE_HEADERS, args.format, max_width=None)
+    else:
+        from tabulate import tabulate
+
+        print(tabulate([coverage.coverage_row(result) for result in results], headers=coverage.COVERAGE_HEADERS, tablefmt="fancy_grid"))
+    coverage.display_summary(summary)
+    if args.report:
+        coverage.write_report(results, summary, args.report)
+
+def run_mitre(args):
+    """ mitre: list, run or browse the Atomic Red Team tests """
+    script = load_script("mitre")
+
+    if args.campaign:
+        run_mitre_campaign(script, args)
+    elif args.list:
+        for test in script.load_tests(args.atomics):
+            print(script.test_label(test))
+    elif args.run:
+        test = script.find_test(args.run, script.load_tests(args.atomics))
+        if test is None:
+            print(f"Unknown technique: {args.run}")
+            sys.exit(1)
+        script.run_test(test["command"])
+    else:
+        script.main(args.atomics)
+
+def run_mitre_campaign(script, args):
+    """ mitre --campaign: launch tests and measure how quickly FortiEDR detects them """
+    import fortiedr_campaign as campaign
+    from fortiedr_client import authenticate
+
+    catalog = script.load_tests(args.atomics)
+    tests = script.tests
+    if args.tests:
+        tests = [script.find_test(test_id, catalog) for test_id in args.tests.split(",")]
+        unknown = [test_id for test_id, test in zip(args.tests.split(","), tests) if test is None]
+        if unknown:
+            print(f"Unknown technique: {', '.join(unknown)}")
+            sys.exit(1)
+
+    # A test without expected FortiEDR rules can never be detected, every run would wait out the timeout
+    ruleless = [f"{test['id']}#{script.test_number(test)}" for test in tests if not campaign.expected_rules(test)]
+    if ruleless:
+        print(f"No FortiEDR rules to expect for {', '.join(ruleless)}: only tests with rules can run in a campaign")
+        sys.exit(1)
+
+    if args.executor == "fake":
+        executor = campaign.FakeExecutor(args.fake_trigger, args.fake_delay, args.fake_detection_rate, args.device)
+    else:
+        executor = campaign.PowerShellExecutor(timeout=args.timeout)
+
+    results = campaign.run_campaign(authenticate(), tests, executor, args.repeat, args.device, args.timeout, args.poll_interval, args.cooldown)
+    summary = campaign.summarize(results)
+    campaign.display_report(summary)
+    if args.report:
+        campaign.write_report(results, summary, args.report)
+
+def startup_probe(command):
+    """ Load a subcommand the way a real invocation does, then report timing and imported heavy modules """
+    load_script(command)
+    elapsed_ms = (time.perf_counter() - START_TIME) * 1000
+    loaded = [module for module in HEAVY_MODULES if module in sys.modules]
+    print(json.dumps({"command": command, "elapsed_ms": elapsed_ms, "heavy_modules": loaded}))
+
+def run_startup_check(args):
+    """ startup-check: fail when a subcommand's cold start exceeds the budget or imports heavy modules """
+    failed = False
+    print(f"{'Command':<18} {'Median (ms)':>12} {'Max (ms)':>10}  Heavy modules")
+
+    for command in SCRIPTS:
+        timings = []
+        loaded = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--startup-probe", command],
+                capture_output=True, text=True
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            if result.returncode != 0:
+                print(f"{command}: startup failed\n{result.stderr}")
+                failed = True
+                break
+            loaded = json.loads(result.stdout.strip().splitlines()[-1])["heavy_modules"]
+
+        if not timings:
+            continue
+        median = statistics.median(timings)
+        over_budget = median > args.budget_ms or loaded
+        failed = failed or bool(over_budget)
+        flag = "  <-- over budget" if over_budget else ""
+        print(f"{command:<18} {median:>12.1f} {max(timings):>10.1f}  {', '.join(loaded) or '-'}{flag}")
+
+    print(f"\nBudget: {args.budget_ms} ms per invocation, no heavy module imported at startup")
+    sys.exit(1 if failed else 0)
+
+def add_tenant_arguments(parser):
+    """ Fan-out options shared by events and hunt """
+    parser.add_argument("--tenants", metavar="FILE", help="JSON inventory of organizations and hosts to query at once (see tenants.example.json)")
+    parser.add_argument("--tenant-timeout", type=float, help="Seconds after which a tenant is reported as timed out and left out of the results")
+    parser.add_argument("--per-host", type=int, default=4, help="Tenants queried at the same time on one management host")
+
+def build_parser():
+    """ Build the argument parser for every subcommand """
+    parser = argparse.ArgumentParser(description="FortiEDR demo toolkit")
+    parser.add_argument("--startup-probe", metavar="COMMAND", help=argparse.SUPPRESS)
+    parser.add_argument("--profile", metavar="FILE", default=os.getenv("FORTIEDR_PROFILE"),
+                        help="Write per-stage timings and counters to FILE (JSON) and FILE.prom (Prometheus text)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    events = subparsers.add_parser("events", help="List FortiEDR events")
+    events.add_argument("--format", choices=["table", "json", "jsonl", "csv", "text"], default="table")
+    events.add_argument("--max-items", type=int, help="Maximum number of events to display")
+    events.add_argument("--action", help="Action filter (Block, SimulationBlock, Log)")
+    window = events.add_mutually_exclusive_group()
+    window.add_argument("--days", type=int, help="Events first seen in the last N days")
+    window.add_argument("--hours", type=int, help="Events first seen in the last X hours")
+    window.add_argument("--from", dest="start_date", metavar="YYYY-MM-DD", help="Start of a custom date range")
+    events.add_argument("--to", dest="end_date", metavar="YYYY-MM-DD", help="End of a custom date range")
+    events.add_argument("--parallel", type=int, help="Number of parallel requests for a sharded export")
+    events.add_argument("--store", choices=["sync", "offline"], help="Query the local event store")
+    events.add_argument("--sort", choices=["firstSeen", "-firstSeen", "lastSeen", "-lastSeen", "eventId", "-eventId"],
+                        help="Sort on disk with bounded memory, dropping duplicate eventIds; --max-items keeps the first sorted events. Prefix - for descending, written with = (--sort=-lastSeen)")
+    events.add_argument("--enrich", action="store_true", help="Attach the threat-hunting activity of each event's device and time window")
+    add_tenant_arguments(events)
+    events.add_argument("--watch", action="store_true", help="Print new or updated events as JSON lines until interrupted")
+    events.add_argument("--min-interval", type=float, default=2, help="Shortest watch poll interval in seconds")
+    events.add_argument("--max-interval", type=float, default=60, help="Longest watch poll interval in seconds")
+    events.set_defaults(func=run_events)
+
+    hunt = subparsers.add_parser("hunt", help="Threat-hunting search")
+    hunt.add_argument("--format", choices=["table", "json", "summary", "parquet", "arrow", "jsonl", "csv", "text"], default="table")
+    hunt.add_argument("--top", type=int, default=10, help="Keys shown per dimension in summary format")
+    hunt.add_argument("--output", help="Output file for parquet / arrow")
+    hunt.add_argument("--max-items", type=int, help="Maximum number of records")
+    hunt.add_argument("--category", help="Process, File, Registry, Network, Event Log, All")
+    hunt.add_argument("--time", help="lastHour, last12hours, last24hours, last7days, last30days, custom")
+    hunt.add_argument("--from", dest="from_date", metavar="YYYY-MM-DD", help="Start date when --time is custom")
+    hunt.add_argument("--batch", metavar="FILE", help="JSON file of named queries to run concurrently")
+    hunt.add_argument("--concurrency", type=int, default=4, help="Batch queries running at the same time")
+    hunt.add_argument("--output-dir", default="hunting-results", help="Directory for batch results")
+    hunt.add_argument("--no-cache", action="store_true", help="Bypass the result cache: always query the server and store nothing")
+    hunt.add_argument("--refresh", action="store_true", help="Query the server and replace the cached result")
+    hunt.add_argument("--cache-ttl", type=int, help="Seconds a relative search (lastHour, last24hours...) is reused (default: 600, or FORTIEDR_HUNT_CACHE_TTL)")
+    hunt.add_argument("--clear-cache", action="store_true", help="Remove every cached result and exit")
+    add_tenant_arguments(hunt)
+    hunt.set_defaults(func=run_hunt)
+
+    malware_list = subparsers.add_parser("malware-list", help="Show recent MalwareBazaar samples")
+    malware_list.set_defaults(func=run_malware_list)
+
+    malware_download = subparsers.add_parser("malware-download", help="Download MalwareBazaar samples")
+    malware_download.add_argument("--tag", help="Malware tag (ransomware, agenttesla, ...)")
+    malware_download.add_argument("--file-type", help="File type (exe, msi, dll, ...)")
+    malware_download.add_argument("--samples", type=int, default=1, help="Number of samples to download")
+    malware_download.add_argument("--concurrency", type=int, default=8, help="Downloads running at the same time")
+    malware_download.add_argument("--cached-tag", metavar="TAG", help="List the samples already stored for a tag and exit")
+    malware_download.set_defaults(func=run_malware_download)
+
+    malware_mirror = subparsers.add_parser("malware-mirror", help="Local mirror of MalwareBazaar get_recent")
+    malware_mirror.add_argument("--poll", type=int, metavar="SECONDS", help="Poll get_recent forever at this interval")
+    malware_mirror.add_argument("--ttl", type=int, default=15 * 60, help="Seconds before the catalog is refreshed again")
+    malware_mirror.add_argument("--tag", help="Show catalog samples with this tag")
+    malware_mirror.add_argument("--file-type", help="Show catalog samples of this file type")
+    malware_mirror.add_argument("--signature", help="Show catalog samples with this signature")
+    malware_mirror.add_argument("--limit", type=int, default=100)
+    malware_mirror.set_defaults(func=run_malware_mirror)
+
+    coverage = subparsers.add_parser("coverage", help="Report which MalwareBazaar samples FortiEDR blocked, detected or missed")
+    coverage.add_argument("--tag", help="Samples of a MalwareBazaar tag (ransomware, agenttesla, ...)")
+    coverage.add_argument("--file-type", help="Samples of a file type (exe, msi, dll, ...)")
+    coverage.add_argument("--samples", type=int, default=100, help="Number of MalwareBazaar samples to check")
+    coverage.add_argument("--stored-tag", metavar="TAG", help="Samples already downloaded to the local store for a tag")
+    coverage.add_argument("--hashes", metavar="FILE", help="File of SHA256 hashes, one per line")
+    coverage_window = coverage.add_mutually_exclusive_group()
+    coverage_window.add_argument("--days", type=int, help="Test window: the last N days")
+    coverage_window.add_argument("--hours", type=int, help="Test window: the last X hours")
+    coverage_window.add_argument("--from", dest="start_date", metavar="YYYY-MM-DD", help="Start of a custom test window")
+    coverage.add_argument("--to", dest="end_date", metavar="YYYY-MM-DD", help="End of a custom test window")
+    coverage.add_argument("--skip-hunting", action="store_true", help="Only match events, not threat-hunting File records")
+    coverage.add_argument("--format", choices=["table", "json", "jsonl", "csv", "text"], default="table")
+    coverage.add_argument("--report", metavar="FILE", help="Write the per-sample results and summary as JSON")
+    coverage.set_defaults(func=run_coverage)
+
+    mitre = subparsers.add_parser("mitre", help="MITRE ATT&CK Atomic Red Team tests")
+    mitre_action = mitre.add_mutually_exclusive_group()
+    mitre_action.add_argument("--list", action="store_true", help="List the available tests")
+    mitre_action.add_argument("--run", metavar="TECHNIQUE_ID", help="Run one test without the menu (ID, or ID#number for a catalog test)")
+    mitre_action.add_argument("--campaign", action="store_true", help="Run tests and measure time to detection in FortiEDR events")
+    mitre.add_argument("--atomics", metavar="PATH", help="Atomic Red Team atomics folder (default: ATOMICS_PATH or the Invoke-AtomicRedTeam location)")
+    mitre.add_argument("--tests", metavar="ID,ID", help="Techniques run by the campaign (default: all)")
+    mitre.add_argument("--repeat", type=int, default=1, help="Runs of every technique")
+    mitre.add_argument("--executor", choices=["powershell", "fake"], default="powershell", help="How tests are launched")
+    mitre.add_argument("--device", help="Only match events from this collector device")
+    mitre.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a detection")
+    mitre.add_argument("--poll-interval", type=float, default=10, help="Seconds between event polls")
+    mitre.add_argument("--cooldown", type=float, default=30, help="Seconds between two launches")
+    mitre.add_argument("--report", metavar="FILE", help="Write every run and the summary as JSON")
+    mitre.add_argument("--fake-trigger", metavar="URL", help="Fake executor: stand-in server endpoint raising the expected rules")
+    mitre.add_argument("--fake-delay", type=float, default=2, help="Fake executor: seconds before the event is raised")
+    mitre.add_argument("--fake-detection-rate", type=float, default=1.0, help="Fake executor: share of launches that are detected")
+    mitre.set_defaults(func=run_mitre)
+
+    startup_check = subparsers.add_parser("startup-check", help="Enforce the cold-start time budget")
+    startup_check.add_argument("--budget-ms", type=float, default=float(os.getenv("FORTIEDR_STARTUP_BUDGET_MS", STARTUP_BUDGET_MS)))
+    startup_check.add_argument("--runs", type=int, default=5, help="Invocations measured per subcommand")
+    startup_check.set_defaults(func=run_startup_check)
+
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.startup_probe:
+        startup_probe(args.startup_probe)
+        return
+    if not args.command:
+        parser.print_help()
+        sys.exit(2)
+
+    if not args.profile:
+        args.func(args)
+        return
+
+    import fortiedr_profile as profile
+
+    try:
+        args.func(args)
+    finally:
+        profile.print_report(file=sys.stderr)
+        json_path, prom_path = profile.write_report(args.profile)
+        print(f"Profile written to {json_path} and {prom_path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
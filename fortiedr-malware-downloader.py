@@ -1,10 +1,24 @@
-import requests
 import os
-import pyzipper
-from datetime import datetime
+import sys
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fortiedr_bazaar_mirror import MB_API_URL, BazaarMirror
+from fortiedr_sample_store import SampleStore
+import fortiedr_profile as profile
 
 import os
 
+# Maximum number of samples downloaded in one run
+MAX_SAMPLES = 1000
+# Downloads running at the same time
+DOWNLOAD_CONCURRENCY = 8
+# Archives being decrypted and extracted at the same time
+EXTRACT_CONCURRENCY = 4
+# Size of the chunks streamed from the response to disk
+CHUNK_SIZE = 64 * 1024
+
 # Function to get the verification setting with debug output
 def get_verify_setting():
     # Check if the environment variable is set
@@ -31,14 +45,13 @@ def get_user_input():
     print("Examples: exe, msi, pdf, dll, ps1, doc, xls, rar")
     file_type = input("Enter file type or press enter to skip: ")
 
-    num_samples = input("\nEnter the number of samples to download (default: 1, max: 5): ") or "1"
-    num_samples = min(int(num_samples), 5)  # Enforcing a maximum of 5 samples
+    num_samples = input(f"\nEnter the number of samples to download (default: 1, max: {MAX_SAMPLES}): ") or "1"
+    num_samples = min(int(num_samples), MAX_SAMPLES)  # Enforcing a maximum number of samples
     return tag, file_type, num_samples
 
 # Function to fetch hashes from MalwareBazaar based on user input
-def fetch_hashes(tag, file_type, num_samples):
-    print(f"\nFetching data with tag: '{tag}', file type: '{file_type}', number of samples: {num_samples}")
-    url = "https://mb-api.abuse.ch/api/v1/"
+def fetch_hashes(tag, file_type, num_samples, mirror=None):
+    print(f"\nFetching data with tag: '{tag}', file type: '{file_type}', number of samples: {num_samples}", file=sys.stderr)
     post_data = {"limit": str(num_samples)}
 
     if tag and not file_type:
@@ -52,71 +65,148 @@ def fetch_hashes(tag, file_type, num_samples):
         post_data["tag"] = tag
         post_data["file_type"] = file_type
     else:
-        print("\nPlease provide a valid tag or file type.")
+        print("\nPlease provide a valid tag or file type.", file=sys.stderr)
         return None
 
+    # Serve from the local MalwareBazaar mirror when it already holds enough matching samples,
+    # otherwise ask the API and keep the answer in the mirror.
     # Use the custom CA certificate or default setting based on the environment
-    response = requests.post(url, data=post_data, verify=get_verify_setting())
-
-    if response.status_code != 200 or 'data' not in response.json() or not response.json()['data']:
-        print(f"\nCould not find malware sample for tag '{tag}' and file type '{file_type}'. Please try a different tag or file type.")
+    mirror = mirror or BazaarMirror(verify=get_verify_setting())
+    with profile.span("fetch_hashes"):
+        mirror.refresh()
+        data = mirror.lookup(tag=tag or None, file_type=file_type or None, limit=num_samples)
+        if len(data) < num_samples:
+            live_data = mirror.query_api(post_data)
+            mirror.merge(live_data)
+            data = live_data or data
+
+    if not data:
+        print(f"\nCould not find malware sample for tag '{tag}' and file type '{file_type}'. Please try a different tag or file type.", file=sys.stderr)
         return None
 
-    data = response.json()['data']
-    return [(item['sha256_hash'], item.get('tags', ['Unknown']), item['file_type_mime']) for item in data]
+    return [(item['sha256_hash'], item.get('tags') or ['Unknown'], item['file_type_mime']) for item in data]
 
-# Function to download and unzip files
-def download_and_unzip(hashes):
-    downloaded_files = []
-    for hash_val, tags, file_type_mime in hashes:
-        primary_tag = tags[0] if tags else "Unknown"
-        file_type = file_type_mime.split('/')[-1]
-        date = datetime.now().strftime("%Y-%m-%d")
-        hash_part = hash_val[:6]
-        new_filename = f"{primary_tag}_{file_type}_{date}_{hash_part}"
-
-        print(f"\nDownloading file with SHA256 hash: {hash_val}")
-        print(f"Tags: {tags}")
-
-        post_data = {
-            "query": "get_file",
-            "sha256_hash": hash_val
-        }
-        # Use the custom CA certificate or default setting based on the environment
-        response = requests.post("https://mb-api.abuse.ch/api/v1/", data=post_data, verify=get_verify_setting())
-        
-        zip_filename = hash_val + ".zip"
+# Function to stream one sample archive to disk in chunks
+def download_sample(session, hash_val, download_dir):
+    post_data = {
+        "query": "get_file",
+        "sha256_hash": hash_val
+    }
+    zip_filename = os.path.join(download_dir, hash_val + ".zip")
+    # Use the custom CA certificate or default setting based on the environment
+    with profile.span("download"), session.post(MB_API_URL, data=post_data, verify=get_verify_setting(), stream=True, timeout=(10, 300)) as response:
+        profile.count("requests")
+        response.raise_for_status()
         with open(zip_filename, 'wb') as file:
-            file.write(response.content)
-        print("Download complete. Unzipping file...")
-
-        try:
-            with pyzipper.AESZipFile(zip_filename) as zf:
-                zf.pwd = b'infected'
-                zf.extractall("Malwares")  # Changed folder name to 'Malwares'
-                unzipped_file_names = zf.namelist()
-                for uf in unzipped_file_names:
-                    original_path = os.path.join("Malwares", uf)  # Changed folder name
-                    new_path = os.path.join("Malwares", new_filename + os.path.splitext(uf)[-1])  # Changed folder name
-
-                    counter = 1
-                    while os.path.exists(new_path):
-                        modified_new_filename = f"{new_filename}_{counter}"
-                        new_path = os.path.join("Malwares", modified_new_filename + os.path.splitext(uf)[-1])  # Changed folder name
-                        counter += 1
-                    
-                    os.rename(original_path, new_path)
-                    downloaded_files.append(new_path)
-
-            print(f"Unzipping and renaming to {new_filename} complete.")
-        except Exception as e:
-            print(f"Error unzipping file: {e}")
-
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                file.write(chunk)
+                profile.count("bytes_received", len(chunk))
+    return zip_filename
+
+# Function to extract the sample from an AES-encrypted archive, hashing it while it is written
+def extract_sample(zip_filename, staging_dir, expected_hash):
+    import pyzipper
+
+    os.makedirs(staging_dir, exist_ok=True)
+    try:
+        with profile.span("extract"), pyzipper.AESZipFile(zip_filename) as zf:
+            zf.pwd = b'infected'
+            for name in zf.namelist():
+                if name.endswith('/'):
+                    continue
+                digest = hashlib.sha256()
+                staged_path = os.path.join(staging_dir, os.path.basename(name))
+                with zf.open(name) as source, open(staged_path, 'wb') as target:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                        target.write(chunk)
+                if digest.hexdigest() == expected_hash.lower():
+                    return staged_path, os.path.splitext(name)[-1]
+                os.remove(staged_path)
+        raise ValueError(f"no file in the archive matches SHA256 {expected_hash}")
+    finally:
         os.remove(zip_filename)
-        print("Zip file removed.")
+
+# Function to download and unzip files: downloads, extraction and indexing run as overlapping stages.
+# Samples already in the store are served from disk without touching the network.
+def download_and_unzip(hashes, max_workers=DOWNLOAD_CONCURRENCY, store=None):
+    import requests
+
+    store = store or SampleStore()
+    work_dir = tempfile.mkdtemp(prefix=".staging-", dir=store.root)
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+
+    downloaded_files = []
+    samples = {}
+    for hash_val, tags, file_type_mime in hashes:
+        cached = store.get(hash_val)
+        if cached:
+            print(f"Already in {store.root}: {hash_val} ({', '.join(tags or [])})")
+            store.add(hash_val, tags, file_type_mime, cached["path"])
+            downloaded_files.append(cached["path"])
+            profile.count("samples_cached")
+        else:
+            samples[hash_val] = (tags, file_type_mime)
+
+    print(f"\nDownloading {len(samples)} samples ({max_workers} at a time)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as downloads, ThreadPoolExecutor(max_workers=EXTRACT_CONCURRENCY) as extractions:
+            # Each future maps to (stage, hash): extraction starts as soon as a download completes,
+            # and the index is only written from this thread
+            pending = {downloads.submit(download_sample, session, hash_val, work_dir): ("download", hash_val) for hash_val in samples}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, hash_val = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error {'downloading' if stage == 'download' else 'unzipping'} {hash_val}: {e}")
+                        profile.count("samples_failed")
+                        continue
+
+                    if stage == "download":
+                        print(f"Downloaded {hash_val}, unzipping...")
+                        staging_dir = os.path.join(work_dir, hash_val)
+                        pending[extractions.submit(extract_sample, result, staging_dir, hash_val)] = ("extract", hash_val)
+                    else:
+                        staged_path, extension = result
+                        tags, file_type_mime = samples[hash_val]
+                        path = store.path_for(hash_val, extension)
+                        with profile.span("store"):
+                            os.replace(staged_path, path)
+                            store.add(hash_val, tags, file_type_mime, path)
+                        downloaded_files.append(path)
+                        profile.count("samples_stored")
+                        print(f"Verified and stored {path} ({', '.join(tags or [])})")
+    finally:
+        session.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
 
     return downloaded_files
 
+# List the samples already stored for a tag
+def list_cached(tag, store=None):
+    store = store or SampleStore()
+    samples = store.by_tag(tag)
+    if not samples:
+        print(f"No samples stored for tag '{tag}'.")
+    for sample in samples:
+        print(f"{sample['sha256']}  {sample['file_type_mime']}  {sample['added']}  {sample['path']}")
+    return samples
+
+# Download the fetched samples and list the resulting files
+def download(hashes, max_workers=DOWNLOAD_CONCURRENCY):
+    if hashes:
+        downloaded_files = download_and_unzip(hashes, max_workers)
+        print("\nDownloaded and unzipped the following files:")
+        for file in downloaded_files:
+            print(file)
+    else:
+        print("No files to download.")
+
 # Main function to handle user input until valid data is fetched
 def main():
     tag, file_type, num_samples = get_user_input()
@@ -125,13 +215,7 @@ def main():
         tag, file_type, num_samples = get_user_input()
         hashes = fetch_hashes(tag, file_type, num_samples)
     
-    if hashes:
-        downloaded_files = download_and_unzip(hashes)
-        print("\nDownloaded and unzipped the following files:")
-        for file in downloaded_files:
-            print(file)
-    else:
-        print("No files to download.")
+    download(hashes)
 
 if __name__ == "__main__":
     main()
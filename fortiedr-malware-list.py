@@ -1,21 +1,18 @@
 #!/usr/bin/env python3
-import requests
-from tabulate import tabulate
-
-def fetch_recent_samples():
-    url = 'https://mb-api.abuse.ch/api/v1/'
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    data = {'query': 'get_recent', 'selector': '100'}
-
-    try:
-        response = requests.post(url, data=data, headers=headers)
-        response_data = response.json()
-        return response_data.get('data', [])
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from MalwareBazaar: {e}")
-        return []
+
+from fortiedr_bazaar_mirror import DEFAULT_TTL, BazaarMirror
+
+def fetch_recent_samples(ttl=DEFAULT_TTL):
+    # Recent samples are served from the local mirror, get_recent is only polled once the TTL expires
+    mirror = BazaarMirror(ttl=ttl)
+    mirror.refresh()
+    samples = mirror.recent(100)
+    mirror.close()
+    return samples
 
 def display_samples_table(samples):
+    from tabulate import tabulate
+
     headers = ["File Name", "File Type", "Signature", "Tags"]
     rows = []
 
@@ -46,9 +43,13 @@ def display_samples_table(samples):
     table = tabulate(rows, headers, tablefmt="grid")
     print(table)
 
-if __name__ == "__main__":
+def main():
     recent_samples = fetch_recent_samples()
     if recent_samples:
         display_samples_table(recent_samples)
     else:
         print("No recent samples found.")
+
+if __name__ == "__main__":
+    main()
+
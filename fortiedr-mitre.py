@@ -1,7 +1,7 @@
 import os
 import subprocess
-import curses
 import textwrap
+from fortiedr_atomic_catalog import DEFAULT_ATOMICS, DEFAULT_CACHE, CatalogIndex, load_catalog, merge_curated, test_number
 
 # Define Atomic Red Team tests in JSON format
 tests = [
@@ -122,62 +122,153 @@ def clear_screen():
     """Clears the console screen"""
     os.system("cls" if os.name == "nt" else "clear")
 
-def display_menu(stdscr):
-    """Displays the interactive menu"""
+def load_tests(atomics_path=None, cache_path=DEFAULT_CACHE):
+    """Returns the curated tests followed by every test of the local Atomic Red Team catalog, when it is installed"""
+    atomics_path = atomics_path or DEFAULT_ATOMICS
+    if not os.path.isdir(atomics_path):
+        return tests
+    try:
+        return merge_curated(load_catalog(atomics_path, cache_path), tests)
+    except ImportError:
+        print("Loading the Atomic Red Team catalog requires PyYAML: pip install pyyaml")
+        return tests
+
+def test_label(test):
+    """One menu line: technique ID, test number and title"""
+    number = f"#{test['number']}" if test.get("number") else "*"
+    return f"{test['id']:<12}{number:<5}{test['title']} - {test['test']}"
+
+def draw_rows(stdscr, rows, drawn):
+    """Writes only the screen rows whose text or attribute changed since the last frame"""
+    height, width = stdscr.getmaxyx()
+    for y in range(height - 1):
+        row = rows.get(y, ("", 0))
+        if drawn.get(y) == row:
+            continue
+        stdscr.move(y, 0)
+        stdscr.clrtoeol()
+        text, attr = row
+        if text:
+            stdscr.addnstr(y, 2, text, max(0, width - 3), attr)
+        drawn[y] = row
+
+def display_menu(stdscr, catalog=None):
+    """Displays the interactive menu: a scrolling list of the catalog with incremental search"""
+    import curses
+
+    catalog = catalog or tests
+    index = CatalogIndex(catalog)
     curses.curs_set(0)
     stdscr.keypad(True)
+    if hasattr(curses, "set_escdelay"):
+        curses.set_escdelay(25)  # ESC clears the search without the default one second delay
     curses.start_color()
     curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_BLACK)   # Titles / Success messages
     curses.init_pair(2, curses.COLOR_YELLOW, curses.COLOR_BLACK)  # Descriptions / Warnings
     curses.init_pair(3, curses.COLOR_GREEN, curses.COLOR_BLACK)   # Commands / Execution text
+
+    query = ""
+    searching = False
+    matches = index.search(query)
     selected_index = 0
+    top = 0
+    drawn = {}
+    stdscr.clear()
 
     while True:
-        stdscr.clear()
-        stdscr.addstr(1, 2, "FortiEDR Demo - MITRE ATT&CK", curses.color_pair(1) | curses.A_BOLD)
-        stdscr.addstr(2, 2, "Use UP/DOWN to navigate, ENTER to select, Q to quit.", curses.color_pair(3))
+        height, _ = stdscr.getmaxyx()
+        list_height = max(1, height - 6)
+        # Keep the selection inside the visible window
+        selected_index = max(0, min(selected_index, len(matches) - 1))
+        if selected_index < top:
+            top = selected_index
+        elif selected_index >= top + list_height:
+            top = selected_index - list_height + 1
 
-        for idx, test in enumerate(tests):
-            if idx == selected_index:
-                stdscr.attron(curses.color_pair(2) | curses.A_REVERSE)
-                stdscr.addstr(4 + idx, 2, f"{test['id']}\t{test['title']}")
-                stdscr.attroff(curses.color_pair(2) | curses.A_REVERSE)
-            else:
-                stdscr.addstr(4 + idx, 2, f"{test['id']}\t{test['title']}", curses.color_pair(2))
-
-        stdscr.addstr(6 + len(tests), 2, "[Q] Quit", curses.color_pair(3))
+        rows = {
+            1: ("FortiEDR Demo - MITRE ATT&CK", curses.color_pair(1) | curses.A_BOLD),
+            2: ("UP/DOWN/PGUP/PGDN to navigate, ENTER to select, / to search, Q to quit.", curses.color_pair(3)),
+            3: (f"Search: {query}{'_' if searching else ''}  ({len(matches)} of {len(catalog)} tests)", curses.color_pair(1)),
+        }
+        # Only the visible slice of the matches is rendered
+        for offset, test_index in enumerate(matches[top:top + list_height]):
+            attr = curses.color_pair(2) | (curses.A_REVERSE if top + offset == selected_index else 0)
+            rows[5 + offset] = (test_label(catalog[test_index]), attr)
+        draw_rows(stdscr, rows, drawn)
+        stdscr.noutrefresh()
+        curses.doupdate()
 
         key = stdscr.getch()
-        if key == curses.KEY_UP:
-            selected_index = (selected_index - 1) % len(tests)
+        if key == curses.KEY_RESIZE:
+            drawn.clear()
+            stdscr.clear()
+        elif key == curses.KEY_UP:
+            selected_index -= 1
         elif key == curses.KEY_DOWN:
-            selected_index = (selected_index + 1) % len(tests)
-        elif key == 10:  # ENTER
-            display_test_details(stdscr, tests[selected_index])
+            selected_index += 1
+        elif key == curses.KEY_PPAGE:
+            selected_index -= list_height
+        elif key == curses.KEY_NPAGE:
+            selected_index += list_height
+        elif key == curses.KEY_HOME:
+            selected_index = 0
+        elif key == curses.KEY_END:
+            selected_index = len(matches) - 1
+        elif key in (10, 13):  # ENTER
+            if searching:
+                searching = False
+            elif matches:
+                display_test_details(stdscr, catalog[matches[selected_index]])
+                drawn.clear()
+                stdscr.clear()
+        elif searching and key == 27:  # ESC clears the search
+            query, searching = "", False
+            matches = index.search(query)
+        elif searching and key in (curses.KEY_BACKSPACE, 127, 8):
+            query = query[:-1]
+            matches = index.search(query)
+        elif searching and 32 <= key < 127:
+            query += chr(key)
+            matches = index.search(query)
+            selected_index = 0
+        elif key == ord('/'):
+            searching = True
         elif key in (ord('q'), ord('Q')):
             break
 
 def display_test_details(stdscr, test):
     """Displays details of the selected test using curses"""
+    import curses
+
+    height, width = stdscr.getmaxyx()
+    wrap = max(20, width - 8)
+    lines = [(f"{test['id']}\t{test['title']}", curses.color_pair(3)), ("", 0), (test['test'], curses.color_pair(1)), ("", 0)]
+    for paragraph in (test.get("description") or "").splitlines():
+        lines.extend((line, curses.color_pair(2)) for line in textwrap.wrap(paragraph, wrap) or [""])
+    lines.append(("", 0))
+    lines.append(("Triggered Rules:", curses.color_pair(3)))
+    lines.extend(("  " + rule, 0) for rule in test["rules"] or ["(no FortiEDR rules recorded for this test)"])
+    lines.append(("", 0))
+    lines.append(("Command:", curses.color_pair(3)))
+    lines.append(("  " + test['command'], 0))
+
+    # Keep the instructions on screen, the rest is cut to the terminal height
+    lines = lines[:max(0, height - 4)]
+    lines.append(("", 0))
+    lines.append(("Press ENTER to execute or BACKSPACE to return.", curses.color_pair(3)))
+
     stdscr.clear()
-    stdscr.addstr(1, 2, f"{test['id']}\t{test['title']}", curses.color_pair(3))  # Green for title
-    stdscr.addstr(3, 2, test['test'], curses.color_pair(1))  # White for test name
-    stdscr.addstr(5, 2, "Triggered Rules:", curses.color_pair(3))  # Green for rules
-    for rule in test["rules"]:
-        stdscr.addstr(6 + test["rules"].index(rule), 4, rule)  # Indented for readability
-    stdscr.addstr(8 + len(test["rules"]), 2, "Command:", curses.color_pair(3))  # Green for command
-    stdscr.addstr(9 + len(test["rules"]), 4, test['command'])
-    stdscr.addstr(11 + len(test["rules"]), 2, "Press ENTER to execute or BACKSPACE to return.", curses.color_pair(3))  # Green for instructions
+    draw_rows(stdscr, {1 + y: line for y, line in enumerate(lines)}, {})
+    stdscr.refresh()
 
     while True:
         key = stdscr.getch()
-        if key == 10:  # ENTER
+        if key in (10, 13):  # ENTER
             curses.endwin()  # Exit curses mode
             run_test(test["command"])  # Run test
-            curses.wrapper(display_menu)  # Restart curses after returning
+            stdscr.refresh()  # Resume curses, the menu redraws itself
             break
-        elif key in (curses.KEY_BACKSPACE, 127):  # Handle BACKSPACE properly
-            display_menu(stdscr)
+        elif key in (curses.KEY_BACKSPACE, 127, 8, 27):  # Handle BACKSPACE properly
             break
 
 def run_test(command):
@@ -185,9 +276,22 @@ def run_test(command):
     clear_screen()
     os.system(f'powershell -ExecutionPolicy Bypass -NoProfile -Command "{command}"')
 
-def main():
+def find_test(test_id, catalog=None):
+    """Returns the test with the given technique ID (or ID#number for one test of the catalog), or None"""
+    test_id, _, number = test_id.partition("#")
+    for test in catalog or tests:
+        if test["id"].lower() != test_id.lower():
+            continue
+        if not number or (number.isdigit() and test_number(test) == int(number)):
+            return test
+    return None
+
+def main(atomics_path=None):
     """Runs the interactive menu inside curses wrapper"""
-    curses.wrapper(display_menu)
+    import curses
+
+    catalog = load_tests(atomics_path)
+    curses.wrapper(display_menu, catalog)
 
 if __name__ == "__main__":
     main()
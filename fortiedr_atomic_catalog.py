@@ -0,0 +1,119 @@
+import os
+import re
+import json
+
+# Local clone of the Atomic Red Team "atomics" folder, as installed by Invoke-AtomicRedTeam
+DEFAULT_ATOMICS = os.getenv("ATOMICS_PATH") or (r"C:\AtomicRedTeam\atomics" if os.name == "nt" else os.path.expanduser("~/AtomicRedTeam/atomics"))
+# Parsed catalog, reused while the YAML files keep the same mtime and size
+DEFAULT_CACHE = "atomic-catalog.json"
+# Bumped when the cached entry layout changes
+CACHE_VERSION = 1
+
+TEST_NUMBER = re.compile(r"-TestNumbers\s+(\d+)", re.IGNORECASE)
+
+def source_files(atomics_path):
+    """ Map each technique YAML (atomics/<ID>/<ID>.yaml) to its (mtime_ns, size) """
+    sources = {}
+    with os.scandir(atomics_path) as entries:
+        for entry in entries:
+            if not entry.is_dir() or not entry.name.startswith("T"):
+                continue
+            path = os.path.join(entry.path, entry.name + ".yaml")
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            sources[path] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+def parse_technique(path):
+    """ Catalog entries of one technique YAML, in the same layout as the curated tests """
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, encoding="utf-8") as f:
+        document = yaml.load(f, Loader=loader) or {}
+
+    technique = document.get("attack_technique", os.path.basename(os.path.dirname(path)))
+    entries = []
+    for number, atomic in enumerate(document.get("atomic_tests") or [], start=1):
+        entries.append({
+            "id": technique,
+            "number": number,
+            "title": document.get("display_name", technique),
+            "test": atomic.get("name", ""),
+            "description": (atomic.get("description") or "").strip(),
+            "platforms": atomic.get("supported_platforms") or [],
+            "rules": [],
+            "command": f"Invoke-AtomicTest {technique} -TestNumbers {number}",
+        })
+    return entries
+
+def load_cache(cache_path, atomics_path):
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION or cache.get("atomics") != os.path.abspath(atomics_path):
+        return {}
+    return cache.get("files") or {}
+
+def load_catalog(atomics_path=None, cache_path=DEFAULT_CACHE):
+    """ Every atomic test of the local catalog; only YAML files changed since the last run are parsed again """
+    atomics_path = atomics_path or DEFAULT_ATOMICS
+    cached = load_cache(cache_path, atomics_path)
+    files = {}
+    changed = False
+
+    for path, stat in sorted(source_files(atomics_path).items()):
+        entry = cached.get(path)
+        if entry and entry["stat"] == stat:
+            files[path] = entry
+        else:
+            files[path] = {"stat": stat, "tests": parse_technique(path)}
+            changed = True
+
+    # Deleted files change the catalog as well
+    if changed or len(files) != len(cached):
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "atomics": os.path.abspath(atomics_path), "files": files}, f)
+
+    return [test for entry in files.values() for test in entry["tests"]]
+
+def test_number(test):
+    """ Number of a test within its technique: parsed for catalog entries, read from -TestNumbers for curated ones """
+    if test.get("number"):
+        return test["number"]
+    match = TEST_NUMBER.search(test["command"])
+    return int(match.group(1)) if match else None
+
+def merge_curated(catalog, curated):
+    """ Curated tests, with their FortiEDR rules, replace their catalog counterparts and come first """
+    curated_keys = {(test["id"], test_number(test)) for test in curated}
+
+    merged = list(curated)
+    for test in catalog:
+        if (test["id"], test["number"]) not in curated_keys:
+            merged.append(test)
+    return merged
+
+class CatalogIndex:
+    """ Incremental search over technique ID, title, test name and rules """
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.haystacks = [
+            " ".join([test["id"], test["title"], test["test"]] + test["rules"]).lower() for test in tests
+        ]
+        self.query = ""
+        self.matches = list(range(len(tests)))
+
+    def search(self, query):
+        """ Indexes of the tests matching every word of query; a longer query only filters the previous matches """
+        query = query.lower()
+        candidates = self.matches if query.startswith(self.query) else range(len(self.tests))
+        words = query.split()
+        self.matches = [i for i in candidates if all(word in self.haystacks[i] for word in words)]
+        self.query = query
+        return self.matches
@@ -0,0 +1,144 @@
+import os
+import json
+import sqlite3
+import time
+import fortiedr_profile as profile
+
+# MalwareBazaar API, can point to a local stand-in server
+MB_API_URL = os.getenv("MB_API_URL", "https://mb-api.abuse.ch/api/v1/")
+# Default location of the local catalog
+DEFAULT_DB = "malwarebazaar.db"
+# Seconds a catalog refresh stays fresh before get_recent is polled again
+DEFAULT_TTL = int(os.getenv("MB_MIRROR_TTL", 15 * 60))
+# Connect / read timeout in seconds for MalwareBazaar requests
+TIMEOUT = (10, 60)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    sha256     TEXT PRIMARY KEY,
+    first_seen TEXT,
+    file_type  TEXT,
+    signature  TEXT,
+    raw        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_first_seen ON samples (first_seen);
+CREATE INDEX IF NOT EXISTS samples_file_type ON samples (file_type, first_seen);
+CREATE INDEX IF NOT EXISTS samples_signature ON samples (signature, first_seen);
+CREATE TABLE IF NOT EXISTS sample_tags (
+    tag    TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (tag, sha256)
+);
+CREATE TABLE IF NOT EXISTS mirror_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class BazaarMirror:
+    """ Local catalog of MalwareBazaar samples fed by get_recent, indexed by tag, file type and signature """
+
+    def __init__(self, path=DEFAULT_DB, api_url=None, ttl=DEFAULT_TTL, verify=True):
+        self.path = path
+        self.api_url = api_url or MB_API_URL
+        self.ttl = ttl
+        self.verify = verify
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def query_api(self, post_data):
+        """ Send one query to MalwareBazaar, returning its data list (empty on errors or no results) """
+        import requests
+
+        try:
+            profile.count("requests")
+            with profile.span("mb_api"):
+                response = requests.post(self.api_url, data=post_data, verify=self.verify, timeout=TIMEOUT)
+            profile.count("bytes_received", len(response.content))
+            with profile.span("json_decode"):
+                response_data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching data from MalwareBazaar: {e}")
+            return []
+
+        data = response_data.get('data')
+        return data if isinstance(data, list) else []
+
+    def last_poll(self):
+        row = self.conn.execute("SELECT value FROM mirror_state WHERE key = 'last_poll'").fetchone()
+        return float(row[0]) if row else 0.0
+
+    def is_stale(self):
+        return time.time() - self.last_poll() > self.ttl
+
+    def merge(self, samples):
+        """ Insert or update samples in the catalog; returns the number merged """
+        rows = []
+        tags = []
+        for sample in samples:
+            sha256 = sample.get('sha256_hash')
+            if not sha256:
+                continue
+            rows.append((sha256, sample.get('first_seen'), (sample.get('file_type') or '').lower(), sample.get('signature'), json.dumps(sample)))
+            tags.extend((tag.lower(), sha256) for tag in sample.get('tags') or [])
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO samples (sha256, first_seen, file_type, signature, raw) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        self.conn.executemany("INSERT OR IGNORE INTO sample_tags (tag, sha256) VALUES (?, ?)", tags)
+        self.conn.commit()
+        return len(rows)
+
+    def refresh(self, force=False):
+        """ Poll get_recent when the catalog is older than the TTL; returns the number of samples merged """
+        if not force and not self.is_stale():
+            return 0
+
+        samples = self.query_api({'query': 'get_recent', 'selector': '100'})
+        if not samples:
+            return 0
+
+        count = self.merge(samples)
+        self.conn.execute("INSERT OR REPLACE INTO mirror_state (key, value) VALUES ('last_poll', ?)", (str(time.time()),))
+        self.conn.commit()
+        return count
+
+    def poll_forever(self, interval=DEFAULT_TTL):
+        """ Merge get_recent into the catalog every interval seconds """
+        while True:
+            count = self.refresh(force=True)
+            total = self.conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} merged {count} recent samples, {total} in {self.path}", flush=True)
+            time.sleep(interval)
+
+    def recent(self, limit=100):
+        """ Most recent samples in the catalog, in get_recent format """
+        rows = self.conn.execute("SELECT raw FROM samples ORDER BY first_seen DESC LIMIT ?", (limit,))
+        return [json.loads(raw) for (raw,) in rows]
+
+    def lookup(self, tag=None, file_type=None, signature=None, limit=100):
+        """ Samples matching a tag, file type and/or signature, like get_taginfo / get_file_type / get_siginfo """
+        sql = "SELECT s.raw FROM samples s"
+        clauses = []
+        args = []
+
+        if tag:
+            sql += " JOIN sample_tags t ON t.sha256 = s.sha256"
+            clauses.append("t.tag = ?")
+            args.append(tag.lower())
+        if file_type:
+            clauses.append("s.file_type = ?")
+            args.append(file_type.lower())
+        if signature:
+            clauses.append("s.signature = ?")
+            args.append(signature)
+
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY s.first_seen DESC LIMIT ?"
+        args.append(limit)
+
+        return [json.loads(raw) for (raw,) in self.conn.execute(sql, args)]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,187 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from fortiedr_atomic_catalog import test_number
+from fortiedr_events import event_device, iter_events
+
+# Timestamp format of the list-events filters and fields
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Seconds to wait for a detection before a launch counts as a miss
+DETECTION_TIMEOUT = 300
+# Seconds between two list-events polls while waiting for a detection
+POLL_INTERVAL = 10
+# Seconds to wait after a detection or miss, so late events are not attributed to the next test
+COOLDOWN = 30
+# Tolerated clock difference between this host and the FortiEDR manager, kept below COOLDOWN
+CLOCK_SKEW = 15
+
+def expected_rules(test):
+    """ Rule names of a test: its "- " entries, without the policy headers """
+    return sorted({rule[2:].strip() for rule in test["rules"] if rule.startswith("- ")})
+
+class PowerShellExecutor:
+    """ Run the Invoke-AtomicTest command of a test with PowerShell (pwsh outside Windows) """
+
+    name = "powershell"
+
+    def __init__(self, shell=None, timeout=DETECTION_TIMEOUT):
+        self.shell = shell or ("powershell" if os.name == "nt" else "pwsh")
+        self.timeout = timeout
+
+    def execute(self, test):
+        try:
+            result = subprocess.run(
+                [self.shell, "-ExecutionPolicy", "Bypass", "-NoProfile", "-Command", test["command"]],
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return {"returncode": None, "error": str(e)}
+        return {"returncode": result.returncode, "error": result.stderr.strip()[-500:] or None}
+
+class FakeExecutor:
+    """ Launch nothing; optionally ask a stand-in server to raise the test's rules after a delay """
+
+    name = "fake"
+
+    def __init__(self, trigger_url=None, delay=2, detection_rate=1.0, device=None):
+        self.trigger_url = trigger_url
+        self.delay = delay
+        self.detection_rate = detection_rate
+        self.device = device or platform.node()
+
+    def execute(self, test):
+        if not self.trigger_url or random.random() >= self.detection_rate:
+            return {"returncode": 0, "error": None}
+
+        import requests
+
+        body = {"rules": expected_rules(test), "process": test["id"], "device": self.device, "delay": self.delay}
+        try:
+            requests.post(self.trigger_url, json=body, timeout=10).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            return {"returncode": 1, "error": str(e)}
+        return {"returncode": 0, "error": None}
+
+def wait_for_detection(method, test, launched, claimed, device=None, timeout=DETECTION_TIMEOUT, poll_interval=POLL_INTERVAL, started=None, not_before=None):
+    """ Poll events seen since the launch until one fires an expected rule of the test, or the timeout expires
+
+    not_before is when the previous launch stopped waiting: events seen earlier belong to it, whatever the clock skew allowance.
+    """
+    rules = set(expected_rules(test))
+    # Time to detection counts from the launch, which may be before a blocking executor returned
+    started = started or time.monotonic()
+    deadline = started + timeout
+    seen_from = launched - timedelta(seconds=CLOCK_SKEW)
+    if not_before and not_before > seen_from:
+        seen_from = not_before
+    params = {"lastSeenFrom": seen_from.strftime(TIME_FORMAT)}
+
+    while True:
+        params["lastSeenTo"] = (datetime.now() + timedelta(seconds=CLOCK_SKEW)).strftime(TIME_FORMAT)
+        matches = []
+        for event in iter_events(method, params):
+            # Repeated occurrences update lastSeen of the same eventId, so (eventId, lastSeen) identifies one detection
+            key = (event.get("eventId"), event.get("lastSeen"))
+            if key in claimed or (device and event_device(event) != device):
+                continue
+            fired = rules.intersection(event.get("rules") or [])
+            if fired:
+                claimed.add(key)
+                matches.append((event, fired))
+
+        if matches:
+            observed = time.monotonic() - started
+            fired = sorted(set().union(*(rules_fired for _, rules_fired in matches)))
+            last_seen = min(event.get("lastSeen") or "" for event, _ in matches)
+            try:
+                event_delay = (datetime.strptime(last_seen, TIME_FORMAT) - launched).total_seconds()
+            except ValueError:
+                event_delay = None
+            return {
+                "detected": True,
+                "seconds_to_detection": observed,
+                "event_delay": event_delay,
+                "rules_fired": fired,
+                "rules_missed": sorted(rules - set(fired)),
+                "event_ids": sorted({event.get("eventId") for event, _ in matches}),
+            }
+
+        if time.monotonic() + poll_interval > deadline:
+            return {"detected": False, "seconds_to_detection": None, "event_delay": None,
+                    "rules_fired": [], "rules_missed": sorted(rules), "event_ids": []}
+        time.sleep(poll_interval)
+
+def run_campaign(method, tests, executor, repeat=1, device=None, timeout=DETECTION_TIMEOUT, poll_interval=POLL_INTERVAL, cooldown=COOLDOWN):
+    """ Launch every test repeat times, one at a time, and time how long FortiEDR takes to report it """
+    results = []
+    claimed = set()
+    # End of the previous launch's detection window, so its late events are not credited to the next launch
+    window_closed = None
+    for run in range(1, repeat + 1):
+        for test in tests:
+            if results:
+                time.sleep(cooldown)
+            print(f"[run {run}/{repeat}] {test['id']} {test['test']}: launching with {executor.name}", file=sys.stderr)
+            launched = datetime.now()
+            started = time.monotonic()
+            launch = executor.execute(test)
+            if launch["error"]:
+                print(f"  launch reported: {launch['error']}", file=sys.stderr)
+
+            result = wait_for_detection(method, test, launched, claimed, device, timeout, poll_interval, started, window_closed)
+            window_closed = datetime.now()
+            result.update({"run": run, "id": test["id"], "number": test_number(test), "title": test["title"],
+                           "launched": launched.strftime(TIME_FORMAT), "returncode": launch["returncode"]})
+            results.append(result)
+
+            if result["detected"]:
+                print(f"  detected after {result['seconds_to_detection']:.1f}s: {', '.join(result['rules_fired'])}", file=sys.stderr)
+            else:
+                print(f"  missed (no expected rule within {timeout}s)", file=sys.stderr)
+    return results
+
+def summarize(results):
+    """ Per test (technique ID and test number): runs, hits, and time-to-detection statistics across runs """
+    summary = {}
+    for result in results:
+        # Tests of the same technique, e.g. T1055#1 and T1055#4, are reported apart
+        technique = summary.setdefault((result["id"], result["number"]), {"id": result["id"], "number": result["number"], "title": result["title"], "runs": 0, "hits": 0, "latencies": [], "rules_fired": set()})
+        technique["runs"] += 1
+        if result["detected"]:
+            technique["hits"] += 1
+            technique["latencies"].append(result["seconds_to_detection"])
+            technique["rules_fired"].update(result["rules_fired"])
+
+    rows = []
+    for technique in summary.values():
+        latencies = technique.pop("latencies")
+        technique["rules_fired"] = sorted(technique["rules_fired"])
+        technique["hit_rate"] = technique["hits"] / technique["runs"]
+        technique["min_seconds"] = min(latencies) if latencies else None
+        technique["median_seconds"] = statistics.median(latencies) if latencies else None
+        technique["max_seconds"] = max(latencies) if latencies else None
+        rows.append(technique)
+    return rows
+
+def display_report(summary):
+    from tabulate import tabulate
+
+    def seconds(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    rows = [
+        [f"{t['id']}#{t['number']}" if t["number"] else t["id"], t["title"], f"{t['hits']}/{t['runs']}", seconds(t["min_seconds"]), seconds(t["median_seconds"]), seconds(t["max_seconds"]), "\n".join(t["rules_fired"]) or "-"]
+        for t in summary
+    ]
+    print(tabulate(rows, headers=["Technique", "Title", "Hits", "Min (s)", "Median (s)", "Max (s)", "Rules fired"], tablefmt="fancy_grid"))
+
+def write_report(results, summary, report_file):
+    with open(report_file, "w") as f:
+        json.dump({"summary": summary, "runs": results}, f, indent=2, default=str)
+    print(f"\nReport written to {report_file}")
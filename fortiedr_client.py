@@ -0,0 +1,151 @@
+import os
+import base64
+import random
+import threading
+import time
+import fortiedr_profile as profile
+
+# HTTP statuses that are retried with backoff
+RETRY_STATUSES = {429, 502, 503, 504}
+# Retries after the first attempt for transient failures
+MAX_RETRIES = 5
+# Backoff in seconds: a random delay up to BACKOFF_BASE * 2^attempt, capped at BACKOFF_MAX
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+# Keep-alive connections kept open to the management server
+POOL_SIZE = 16
+# Connect / read timeout in seconds
+TIMEOUT = (10, 120)
+
+# Authenticated clients for this process, keyed by (host, organization, user)
+_clients = {}
+_clients_lock = threading.Lock()
+
+class FortiEDRClient:
+    """ FortiEDR REST client reusing pooled connections and retrying transient failures """
+
+    def __init__(self, host, user, password, org=None, pool_size=POOL_SIZE, max_retries=MAX_RETRIES):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Accept "https://host/" as well as a bare host name, like the fortiedr package.
+        # An explicit http:// scheme is kept, for local stand-in servers.
+        scheme = "http" if host.startswith("http://") else "https"
+        host = host.split("://")[-1].strip("/")
+        self.host = host
+        self.organization = org
+        self.base_url = f"{scheme}://{host}/management-rest"
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        credentials = f"{org}\\{user}:{password}" if org else f"{user}:{password}"
+        token = base64.b64encode(credentials.encode()).decode("ascii")
+        self.session.headers["Authorization"] = f"Basic {token}"
+
+        self.request_count = 0
+        self.retry_count = 0
+
+    def backoff(self, attempt, response=None):
+        """ Seconds to wait before the next attempt, honouring Retry-After when the server sends it """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(int(retry_after), BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, method, path, params=None, body=None):
+        """ Send a request and return {'status': bool, 'data': ...} like the fortiedr package """
+        import requests
+
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                self.request_count += 1
+                profile.count("requests")
+                with profile.span("http"):
+                    response = self.session.request(method, url, params=params, json=body, timeout=TIMEOUT)
+                profile.count("bytes_received", len(response.content))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    return {'status': False, 'data': {'status_code': 500, 'error_message': f'Failed to connect to {url}. Error: {e}'}}
+            except requests.exceptions.RequestException as e:
+                return {'status': False, 'data': {'status_code': 500, 'error_message': str(e)}}
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+
+            self.retry_count += 1
+            profile.count("retries")
+            with profile.span("retry_backoff"):
+                time.sleep(self.backoff(attempt, response))
+
+        if not response.ok:
+            try:
+                error_message = response.json().get('errorMessage', response.text)
+            except ValueError:
+                error_message = response.text
+            return {'status': False, 'data': {'status_code': response.status_code, 'error_message': error_message}}
+
+        try:
+            with profile.span("json_decode"):
+                return {'status': True, 'data': response.json()}
+        except ValueError:  # If response is not JSON
+            return {'status': True, 'data': response.text}
+
+    def authenticate(self):
+        """ Check the credentials with a one-item list-events request """
+        data = self.request("GET", "/events/list-events", params={"pageNumber": 0, "itemsPerPage": 1})
+        if data['status']:
+            return {'status': True, 'data': 'AUTHENTICATION_SUCCEEDED'}
+        return data
+
+    def list_events(self, **params):
+        """ GET events/list-events, list parameters are sent comma-separated """
+        query = {}
+        for key, value in params.items():
+            if value is None:
+                continue
+            query[key] = ",".join(map(str, value)) if isinstance(value, (list, tuple)) else value
+        return self.request("GET", "/events/list-events", params=query)
+
+    def search(self, **params):
+        """ POST threat-hunting/search """
+        body = {key: value for key, value in params.items() if value is not None}
+        return self.request("POST", "/threat-hunting/search", body=body)
+
+    def close(self):
+        self.session.close()
+
+def get_client(host=None, user=None, password=None, org=None):
+    """ Return the authenticated client for these credentials, creating it once per process """
+    host = host or os.getenv("FORTIEDR_HOST")
+    user = user or os.getenv("FORTIEDR_USER")
+    password = password or os.getenv("FORTIEDR_PASS")
+    org = org or os.getenv("FORTIEDR_ORG")
+    key = (host, org, user)
+
+    with _clients_lock:
+        if key in _clients:
+            return _clients[key]
+
+        client = FortiEDRClient(host, user, password, org)
+        with profile.span("auth"):
+            authentication = client.authenticate()
+        if not authentication['status']:
+            client.close()
+            raise PermissionError(authentication['data'])
+
+        _clients[key] = client
+        return client
+
+def authenticate():
+    """ Authenticate to FortiEDR using credentials from .env, exiting on failure """
+    try:
+        return get_client()
+    except PermissionError as e:
+        print("Authentication failed:", e)
+        exit()
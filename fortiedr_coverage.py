@@ -0,0 +1,160 @@
+import json
+import sys
+from datetime import datetime
+import fortiedr_profile as profile
+from fortiedr_schema import compile_getter
+
+# Timestamp format of list-events fields and filters
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Event fields that may carry the SHA256 of the detected file
+EVENT_HASH_FIELDS = ("hash", "sha256", "fileHash")
+# Threat-hunting record paths that may carry a file SHA256
+HUNTING_HASH_PATHS = [
+    ("Target", "File", "Hash"),
+    ("Target", "File", "SHA256"),
+    ("Source", "Process", "Hash"),
+    ("Source", "Process", "SHA256"),
+]
+# Event actions counted as a block
+BLOCK_ACTIONS = {"Block"}
+# Coverage statuses, best first
+STATUSES = ("blocked", "detected", "telemetry", "missed")
+# Columns of the coverage table, CSV and text output
+COVERAGE_HEADERS = ["SHA256", "Status", "Tags", "Events", "Devices", "First Event", "Delay (s)", "First Telemetry"]
+
+def sample_index(samples, started=None):
+    """ SHA256 -> coverage entry for each sample, from (sha256, tags, file_type_mime[, added]) tuples """
+    index = {}
+    for sample in samples:
+        sha256, tags, file_type_mime = sample[:3]
+        added = sample[3] if len(sample) > 3 else None
+        index[sha256.lower()] = {
+            "sha256": sha256.lower(),
+            "tags": list(tags or []),
+            "file_type_mime": file_type_mime,
+            # Detection delay counts from the sample's download when known, from the start of the test window otherwise
+            "reference": added or started,
+            "status": "missed",
+            "event_ids": [],
+            "devices": set(),
+            "first_event": None,
+            "first_telemetry": None,
+            "telemetry_records": 0,
+        }
+    return index
+
+def match_events(index, events):
+    """ Mark the samples of index named by a hash field of each event; one dict lookup per field """
+    matched = 0
+    for event in events:
+        for field in EVENT_HASH_FIELDS:
+            value = event.get(field)
+            entry = index.get(value.lower()) if isinstance(value, str) else None
+            if entry is None:
+                continue
+            matched += 1
+            entry["event_ids"].append(event.get("eventId"))
+            entry["devices"].update(collector.get("device") for collector in event.get("collectors") or [] if collector.get("device"))
+            first_seen = event.get("firstSeen")
+            if first_seen and (entry["first_event"] is None or first_seen < entry["first_event"]):
+                entry["first_event"] = first_seen
+            if event.get("action") in BLOCK_ACTIONS:
+                entry["status"] = "blocked"
+            elif entry["status"] != "blocked":
+                entry["status"] = "detected"
+            break
+    profile.count("coverage_events_matched", matched)
+    return matched
+
+def match_hunting(index, pages):
+    """ Mark the samples of index named by a file hash of each threat-hunting record """
+    getters = [compile_getter(path) for path in HUNTING_HASH_PATHS]
+    matched = 0
+    for page in pages:
+        with profile.span("coverage_match"):
+            for record in page:
+                for getter in getters:
+                    value = getter(record)
+                    entry = index.get(value.lower()) if isinstance(value, str) else None
+                    if entry is None:
+                        continue
+                    matched += 1
+                    entry["telemetry_records"] += 1
+                    if record.get("Time") is not None:
+                        seen = datetime.fromtimestamp(record["Time"] / 1000).strftime(TIME_FORMAT)
+                        if entry["first_telemetry"] is None or seen < entry["first_telemetry"]:
+                            entry["first_telemetry"] = seen
+                    if record.get("Device", {}).get("Name"):
+                        entry["devices"].add(record["Device"]["Name"])
+                    if entry["status"] == "missed":
+                        entry["status"] = "telemetry"
+                    break
+    profile.count("coverage_records_matched", matched)
+    return matched
+
+def detection_delay(entry):
+    """ Seconds from the sample's reference time to its first event, None when unknown """
+    if not entry["first_event"] or not entry["reference"]:
+        return None
+    try:
+        return (datetime.strptime(entry["first_event"], TIME_FORMAT) - datetime.strptime(entry["reference"], TIME_FORMAT)).total_seconds()
+    except ValueError:
+        return None
+
+def coverage_rows(index):
+    """ One result per sample, blocked first, with its detection delay """
+    results = []
+    for entry in index.values():
+        results.append({
+            "sha256": entry["sha256"],
+            "status": entry["status"],
+            "tags": entry["tags"],
+            "file_type_mime": entry["file_type_mime"],
+            "event_ids": sorted(event_id for event_id in entry["event_ids"] if event_id is not None),
+            "devices": sorted(entry["devices"]),
+            "first_event": entry["first_event"],
+            "delay_seconds": detection_delay(entry),
+            "first_telemetry": entry["first_telemetry"],
+            "telemetry_records": entry["telemetry_records"],
+        })
+    results.sort(key=lambda result: (STATUSES.index(result["status"]), result["sha256"]))
+    return results
+
+def coverage_row(result):
+    """ Project a coverage result onto COVERAGE_HEADERS """
+    return [
+        result["sha256"],
+        result["status"],
+        ", ".join(result["tags"]),
+        len(result["event_ids"]),
+        ", ".join(result["devices"][:3]) + (" ..." if len(result["devices"]) > 3 else ""),
+        result["first_event"] or "-",
+        f"{result['delay_seconds']:.0f}" if result["delay_seconds"] is not None else "-",
+        result["first_telemetry"] or "-",
+    ]
+
+def summarize(results):
+    """ Sample count per status and delay statistics of the detected samples """
+    counts = {status: 0 for status in STATUSES}
+    for result in results:
+        counts[result["status"]] += 1
+    delays = sorted(result["delay_seconds"] for result in results if result["delay_seconds"] is not None)
+    return {
+        "samples": len(results),
+        **counts,
+        "detection_rate": (counts["blocked"] + counts["detected"]) / len(results) if results else None,
+        "median_delay_seconds": delays[len(delays) // 2] if delays else None,
+        "max_delay_seconds": delays[-1] if delays else None,
+    }
+
+def display_summary(summary):
+    rate = f"{100 * summary['detection_rate']:.1f}%" if summary["detection_rate"] is not None else "-"
+    print(f"\n{summary['samples']} samples: {summary['blocked']} blocked, {summary['detected']} detected, "
+          f"{summary['telemetry']} telemetry only, {summary['missed']} missed (detection rate {rate})", file=sys.stderr)
+    if summary["median_delay_seconds"] is not None:
+        print(f"Delay to first event: median {summary['median_delay_seconds']:.0f}s, max {summary['max_delay_seconds']:.0f}s", file=sys.stderr)
+
+def write_report(results, summary, report_file):
+    with open(report_file, "w") as f:
+        json.dump({"summary": summary, "samples": results}, f, indent=2)
+    print(f"\nReport written to {report_file}", file=sys.stderr)
@@ -0,0 +1,161 @@
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import fortiedr_profile as profile
+from fortiedr_events import event_device
+
+# Timestamp format of list-events fields and threat-hunting filters
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Activity searched before an event's firstSeen and after its lastSeen
+WINDOW_BEFORE = timedelta(minutes=5)
+WINDOW_AFTER = timedelta(minutes=5)
+# Longest time span merged into one hunting query
+MAX_GROUP_SPAN = timedelta(hours=6)
+# Hunting searches running at the same time
+ENRICH_CONCURRENCY = 4
+# Records requested per hunting page, and the most fetched for one group
+PAGE_SIZE = 1000
+MAX_GROUP_RECORDS = 10000
+# Records attached to a single event
+MAX_ACTIVITY = 50
+
+def event_window(event, before=WINDOW_BEFORE, after=WINDOW_AFTER):
+    """ Time range around an event whose activity is attached to it """
+    first_seen = datetime.strptime(event["firstSeen"], TIME_FORMAT)
+    last_seen = datetime.strptime(event.get("lastSeen") or event["firstSeen"], TIME_FORMAT)
+    return first_seen - before, last_seen + after
+
+def group_windows(events, before=WINDOW_BEFORE, after=WINDOW_AFTER, max_span=MAX_GROUP_SPAN):
+    """ Group events by device, merging overlapping windows into (device, start, end, events) groups """
+    by_device = defaultdict(list)
+    for event in events:
+        device = event_device(event)
+        if device and event.get("firstSeen"):
+            by_device[device].append((*event_window(event, before, after), event))
+
+    groups = []
+    for device, windows in by_device.items():
+        windows.sort(key=lambda window: window[0])
+        start, end, members = None, None, []
+        for window_start, window_end, event in windows:
+            if members and window_start <= end and max(end, window_end) - start <= max_span:
+                end = max(end, window_end)
+                members.append(event)
+                continue
+            if members:
+                groups.append((device, start, end, members))
+            start, end, members = window_start, window_end, [event]
+        if members:
+            groups.append((device, start, end, members))
+    return groups
+
+class ActivityCache:
+    """ Hunting records per device and time window; a cached window also answers any window it contains """
+
+    def __init__(self):
+        self.windows = defaultdict(list)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, device, start, end):
+        with self.lock:
+            for cached_start, cached_end, times, records in self.windows[device]:
+                if cached_start <= start and end <= cached_end:
+                    self.hits += 1
+                    return records[bisect_left(times, start):bisect_right(times, end)]
+            self.misses += 1
+            return None
+
+    def put(self, device, start, end, records):
+        records = sorted(records, key=record_time)
+        with self.lock:
+            self.windows[device].append((start, end, [record_time(record) for record in records], records))
+        return records
+
+# Activity already fetched by this process
+_cache = ActivityCache()
+
+def record_time(record):
+    return datetime.fromtimestamp(record["Time"] / 1000) if record.get("Time") is not None else datetime.min
+
+def search_group(method, device, start, end, category="All", max_records=MAX_GROUP_RECORDS):
+    """ One threat-hunting query for a device and time window, every page; returns (records, truncated), or None when a request failed """
+    params = {
+        "category": category,
+        "devices": [device],
+        "time": "custom",
+        "fromTime": start.strftime(TIME_FORMAT),
+        "toTime": end.strftime(TIME_FORMAT),
+    }
+    records = []
+    page_number = 0
+    while True:
+        with profile.span("enrich_search"):
+            data = method.search(**params, pageNumber=page_number, itemsPerPage=PAGE_SIZE)
+        if not data['status']:
+            print(f"Failed to retrieve activity for {device} {params['fromTime']} - {params['toTime']}:", data['data'], file=sys.stderr)
+            return None
+        records.extend(data['data'])
+        if len(data['data']) < PAGE_SIZE:
+            return records[:max_records], len(records) > max_records
+        if len(records) >= max_records:
+            print(f"Activity for {device} {params['fromTime']} - {params['toTime']} capped at {max_records} records", file=sys.stderr)
+            return records[:max_records], True
+        page_number += 1
+
+def enrich_events(method, events, cache=None, max_workers=ENRICH_CONCURRENCY, before=WINDOW_BEFORE, after=WINDOW_AFTER, max_activity=MAX_ACTIVITY):
+    """ Attach to each event the hunting records of its device within its time window, as event["activity"] """
+    events = list(events)
+    cache = cache if cache is not None else _cache
+    hits, misses = cache.hits, cache.misses
+    groups = group_windows(events, before, after)
+
+    def fetch(group):
+        """ (records sorted by time, truncated), or None when the search failed """
+        device, start, end, _ = group
+        records = cache.get(device, start, end)
+        if records is not None:
+            return records, False
+        found = search_group(method, device, start, end)
+        if found is None:
+            return None
+        records, truncated = found
+        if truncated:
+            # A capped window would answer the windows it contains with missing records
+            return sorted(records, key=record_time), True
+        return cache.put(device, start, end, records), False
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (device, _, _, members), found in zip(groups, executor.map(fetch, groups)):
+            if found is None:
+                # Left without activityCount, so the event shows N/A rather than no activity
+                failed += 1
+                continue
+            records, truncated = found
+            times = [record_time(record) for record in records]
+            for event in members:
+                start, end = event_window(event, before, after)
+                matched = records[bisect_left(times, start):bisect_right(times, end)]
+                event["activityCount"] = len(matched)
+                event["activity"] = matched[:max_activity]
+                if truncated:
+                    event["activityTruncated"] = True
+
+    devices = len({group[0] for group in groups})
+    print(f"Enriched {len(events)} events on {devices} devices with {cache.misses - misses} hunting searches ({cache.hits - hits} cached, {failed} failed)", file=sys.stderr)
+    return events
+
+def activity_summary(event, top=3):
+    """ Record count and most frequent record types, for table output """
+    if "activityCount" not in event:
+        return "N/A"
+    types = Counter(record.get("Type") for record in event["activity"])
+    top_types = ", ".join(f"{name} {count}" for name, count in types.most_common(top))
+    # A capped search only counts part of the activity
+    count = f"{event['activityCount']}+" if event.get("activityTruncated") else f"{event['activityCount']}"
+    return count + (f": {top_types}" if top_types else "")
@@ -0,0 +1,102 @@
+import json
+import sqlite3
+
+# Default location of the local event store
+DEFAULT_DB = "fortiedr-events.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id   INTEGER PRIMARY KEY,
+    action     TEXT,
+    first_seen TEXT,
+    last_seen  TEXT,
+    raw        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_action ON events (action, first_seen);
+CREATE INDEX IF NOT EXISTS events_first_seen ON events (first_seen);
+CREATE INDEX IF NOT EXISTS events_last_seen ON events (last_seen);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class EventStore:
+    """ Local SQLite copy of FortiEDR events keyed by eventId """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def high_water_mark(self):
+        """ Return the largest lastSeen synced so far, or None for an empty store """
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = 'lastSeen'").fetchone()
+        return row[0] if row else None
+
+    def upsert(self, events, batch_size=1000, errors=None):
+        """ Insert or update events, committed per batch; returns the number written.
+
+        The lastSeen high-water mark only advances once every event was read and errors (filled by the event source) stays empty.
+        """
+        high_water_mark = self.high_water_mark()
+        count = 0
+        batch = []
+
+        def flush():
+            self.conn.executemany(
+                "INSERT INTO events (event_id, action, first_seen, last_seen, raw) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (event_id) DO UPDATE SET action = excluded.action, first_seen = excluded.first_seen, "
+                "last_seen = excluded.last_seen, raw = excluded.raw",
+                batch
+            )
+            self.conn.commit()
+            batch.clear()
+
+        for entry in events:
+            last_seen = entry.get("lastSeen")
+            if last_seen and (high_water_mark is None or last_seen > high_water_mark):
+                high_water_mark = last_seen
+            batch.append((entry["eventId"], entry.get("action"), entry.get("firstSeen"), last_seen, json.dumps(entry)))
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+
+        flush()
+        # A failed or interrupted sync keeps the previous mark, so the next one fetches the missing events again
+        if high_water_mark and not errors:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('lastSeen', ?)", (high_water_mark,)
+            )
+            self.conn.commit()
+        return count
+
+    def query(self, action_filter=None, first_seen_from=None, first_seen_to=None, max_items=None):
+        """ Yield stored events matching the same filters as list-events, newest first """
+        sql = "SELECT raw FROM events"
+        clauses = []
+        args = []
+
+        if action_filter:
+            actions = [action.strip() for action in action_filter.split(",") if action.strip()]
+            clauses.append(f"action IN ({', '.join('?' * len(actions))})")
+            args.extend(actions)
+        if first_seen_from:
+            clauses.append("first_seen >= ?")
+            args.append(first_seen_from)
+        if first_seen_to:
+            clauses.append("first_seen <= ?")
+            args.append(first_seen_to)
+
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY first_seen DESC, event_id DESC"
+        if max_items:
+            sql += " LIMIT ?"
+            args.append(max_items)
+
+        for (raw,) in self.conn.execute(sql, args):
+            yield json.loads(raw)
+
+    def close(self):
+        self.conn.close()
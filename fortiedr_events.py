@@ -0,0 +1,64 @@
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import fortiedr_profile as profile
+
+# list-events accepts at most 1,000 items per page
+PAGE_SIZE = 1000
+# Number of pages requested ahead of the one being displayed
+PREFETCH_PAGES = 2
+
+def event_device(event):
+    """ Device name of an event's first collector, or None """
+    collectors = event.get("collectors") or []
+    return collectors[0].get("device") if collectors else None
+
+def iter_events(method, params, max_items=None, page_size=PAGE_SIZE, prefetch=PREFETCH_PAGES, errors=None):
+    """ Yield events page by page, fetching the next pages in the background; failures are printed or added to errors """
+    if max_items:
+        page_size = min(page_size, max_items)
+        last_page = (max_items - 1) // page_size
+    else:
+        last_page = None
+
+    executor = ThreadPoolExecutor(max_workers=prefetch + 1)
+    pending = deque()
+    next_page = 0
+    remaining = max_items
+
+    def submit_next():
+        nonlocal next_page
+        if last_page is not None and next_page > last_page:
+            return
+        pending.append(executor.submit(method.list_events, **params, pageNumber=next_page, itemsPerPage=page_size))
+        next_page += 1
+
+    try:
+        for _ in range(prefetch + 1):
+            submit_next()
+
+        while pending:
+            with profile.span("wait_page"):
+                data = pending.popleft().result()
+            if not data['status']:
+                if errors is None:
+                    print("Error in fetching data.", data['data'], file=sys.stderr)
+                else:
+                    errors.append(data['data'])
+                return
+
+            page = data['data']
+            # A short page is the last one, anything queued after it is empty
+            if len(page) < page_size:
+                pending.clear()
+            else:
+                submit_next()
+
+            for entry in page:
+                yield entry
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining == 0:
+                        return
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,112 @@
+import heapq
+import json
+import sys
+import tempfile
+from itertools import islice
+import fortiedr_profile as profile
+
+# Fields events can be sorted on
+SORT_FIELDS = ("firstSeen", "lastSeen", "eventId")
+# Events sorted in memory before a run is spilled to disk
+RUN_SIZE = 100000
+# Runs merged at once; more runs are first merged into larger ones to bound open files
+MAX_OPEN_RUNS = 64
+
+def sort_key(field):
+    """ Key function ordering events on field, then eventId so copies of an event end up next to each other """
+    if field == "eventId":
+        # Copies of an event are ordered by lastSeen, the most recent one last
+        return lambda event: (event.get("eventId") or 0, event.get("organization") or "", event.get("lastSeen") or "")
+    return lambda event: (event.get(field) or "", event.get("eventId") or 0, event.get("organization") or "")
+
+def event_identity(event):
+    # eventIds are only unique within an organization, fan-out results carry theirs
+    return event.get("organization"), event.get("eventId")
+
+def spill(records, tmp_dir=None):
+    """ Write sorted records to a temporary file, one JSON line each, and rewind it """
+    run = tempfile.TemporaryFile("w+", encoding="utf-8", dir=tmp_dir)
+    with profile.span("sort_spill"):
+        run.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        run.seek(0)
+    return run
+
+def read_run(run):
+    try:
+        for line in run:
+            yield json.loads(line)
+    finally:
+        run.close()
+
+def merge_runs(runs, key, reverse=False, tmp_dir=None):
+    """ K-way merge of sorted runs, never holding more than MAX_OPEN_RUNS of them open """
+    while len(runs) > MAX_OPEN_RUNS:
+        merged = []
+        for start in range(0, len(runs), MAX_OPEN_RUNS):
+            group = runs[start:start + MAX_OPEN_RUNS]
+            merged.append(spill(heapq.merge(*map(read_run, group), key=key, reverse=reverse), tmp_dir))
+        runs = merged
+    return heapq.merge(*map(read_run, runs), key=key, reverse=reverse)
+
+def sorted_runs(events, key, reverse=False, run_size=RUN_SIZE, tmp_dir=None):
+    """ Sort events in bounded memory: one sorted run per run_size events, spilled to disk when there is more than one """
+    events = iter(events)
+    runs = []
+    while True:
+        with profile.span("sort_run"):
+            run = sorted(islice(events, run_size), key=key, reverse=reverse)
+        if not run:
+            break
+        if not runs and len(run) < run_size:
+            # Everything fit in a single run, no need to touch the disk
+            return iter(run), 0
+        runs.append(spill(run, tmp_dir))
+    return merge_runs(runs, key, reverse, tmp_dir), len(runs)
+
+def drop_duplicates(events, keep_last=False, stats=None):
+    """ Drop consecutive events with the same eventId, keeping the first (or last) copy """
+    previous = None
+    for event in events:
+        if previous is not None and event_identity(event) == event_identity(previous):
+            if stats is not None:
+                stats["duplicates"] += 1
+            if keep_last:
+                previous = event
+            continue
+        if previous is not None:
+            yield previous
+        previous = event
+    if previous is not None:
+        yield previous
+
+def external_sort(events, field="firstSeen", reverse=False, dedupe=True, run_size=RUN_SIZE, tmp_dir=None):
+    """ Sort events on field with bounded memory, dropping duplicate eventIds (the copy with the latest lastSeen is kept) """
+    if field not in SORT_FIELDS:
+        raise ValueError(f"cannot sort on {field}, expected one of {', '.join(SORT_FIELDS)}")
+
+    stats = {"events": 0, "runs": 0, "duplicates": 0}
+
+    def counted(items):
+        for item in items:
+            stats["events"] += 1
+            yield item
+
+    events = counted(events)
+    if dedupe and field != "eventId":
+        # Copies of an event may carry different lastSeen values, so they are first brought together by eventId
+        by_id, runs = sorted_runs(events, sort_key("eventId"), run_size=run_size, tmp_dir=tmp_dir)
+        stats["runs"] += runs
+        events = drop_duplicates(by_id, keep_last=True, stats=stats)
+
+    merged, runs = sorted_runs(events, sort_key(field), reverse, run_size, tmp_dir)
+    stats["runs"] += runs
+    if dedupe and field == "eventId":
+        merged = drop_duplicates(merged, keep_last=not reverse, stats=stats)
+
+    yield from merged
+    print(f"Sorted {stats['events']} events on {'-' if reverse else ''}{field} ({stats['runs']} runs spilled to disk, {stats['duplicates']} duplicates dropped)", file=sys.stderr)
+
+def parse_sort(option):
+    """ "firstSeen" or "-firstSeen" (descending) -> (field, reverse) """
+    option = option.strip()
+    return option.lstrip("-"), option.startswith("-")
@@ -0,0 +1,162 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+import fortiedr_profile as profile
+
+# Default location of the hunting result cache
+DEFAULT_DB = "fortiedr-hunt-cache.db"
+# Seconds a relative search (lastHour, last24hours, ...) is reused: results are shared within one bucket of this length
+DEFAULT_TTL = int(os.getenv("FORTIEDR_HUNT_CACHE_TTL", 10 * 60))
+# Compressed bytes kept on disk before the least recently used results are evicted
+DEFAULT_MAX_BYTES = int(os.getenv("FORTIEDR_HUNT_CACHE_MB", 256)) * 1024 * 1024
+# Timestamp format of fromTime / toTime
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Parameters that only drive paging, not what a search returns
+PAGING_PARAMS = {"pageNumber"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key       TEXT PRIMARY KEY,
+    params    TEXT NOT NULL,
+    created   REAL NOT NULL,
+    expires   REAL,
+    last_used REAL NOT NULL,
+    records   INTEGER,
+    size      INTEGER NOT NULL,
+    payload   BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+def normalize(search_params):
+    """ Search parameters in a canonical form: no paging, sorted keys, case-insensitive category and period """
+    params = {}
+    for key, value in search_params.items():
+        if key in PAGING_PARAMS or value in (None, ""):
+            continue
+        if key in ("category", "time") and isinstance(value, str):
+            value = value.strip().lower()
+        if isinstance(value, list):
+            value = sorted(value, key=str)
+        params[key] = value
+    return params
+
+def time_bucket(params, ttl, now=None):
+    """ Bucket number for searches relative to now, None for a window that ended more than ttl seconds ago """
+    now = now or time.time()
+    to_time = params.get("toTime")
+    if to_time:
+        try:
+            if datetime.strptime(to_time, TIME_FORMAT).timestamp() < now - ttl:
+                # Late records may still trickle in, but a closed window is not moving with the clock
+                return None
+        except ValueError:
+            pass
+    return int(now // ttl)
+
+class HuntCache:
+    """ Threat-hunting results on disk, keyed by tenant and normalized search parameters, evicted least recently used first """
+
+    def __init__(self, path=DEFAULT_DB, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def key(self, method, search_params, max_items=None, mode="pages"):
+        """ Cache key and canonical parameters of a search; relative periods are aligned to ttl-long buckets """
+        params = normalize(search_params)
+        bucket = time_bucket(params, self.ttl)
+        identity = {
+            "host": getattr(method, "host", None),
+            "organization": getattr(method, "organization", None),
+            "params": params,
+            "maxItems": max_items,
+            "mode": mode,
+            "bucket": bucket,
+        }
+        key = json.dumps(identity, sort_keys=True, separators=(",", ":"))
+        expires = (bucket + 1) * self.ttl if bucket is not None else None
+        return key, params, expires
+
+    def get(self, key):
+        """ Cached pages for a key, or None when missing or expired """
+        now = time.time()
+        with self.lock, profile.span("hunt_cache_read"):
+            row = self.conn.execute("SELECT payload, expires FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                profile.count("hunt_cache_misses")
+                return None
+            self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            pages = json.loads(zlib.decompress(row[0]))
+        profile.count("hunt_cache_hits")
+        return pages
+
+    def put(self, key, params, expires, pages):
+        """ Store the pages of a completed search """
+        with profile.span("hunt_cache_write"):
+            payload = zlib.compress(json.dumps(pages, separators=(",", ":")).encode("utf-8"))
+        return self.store(key, params, expires, payload, sum(len(page) for page in pages))
+
+    def store(self, key, params, expires, payload, records):
+        """ Write a compressed result, then evict expired and least recently used results over max_bytes """
+        if len(payload) > self.max_bytes:
+            return False
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, params, created, expires, last_used, records, size, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(params, sort_keys=True), now, expires, now, records, len(payload), payload)
+            )
+            self.conn.execute("DELETE FROM results WHERE expires IS NOT NULL AND expires <= ?", (now,))
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            for old_key, size in self.conn.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                total -= size
+                profile.count("hunt_cache_evictions")
+            self.conn.commit()
+        return True
+
+    def cached_pages(self, key, params, expires, pages, errors):
+        """ Pass pages through while compressing them, and store the result once the search completed without errors """
+        compressor = zlib.compressobj()
+        chunks = [compressor.compress(b"[")]
+        size = 0
+        records = 0
+        for page in pages:
+            if chunks is not None:
+                with profile.span("hunt_cache_write"):
+                    chunk = compressor.compress((b"," if len(chunks) > 1 else b"") + json.dumps(page, separators=(",", ":")).encode("utf-8"))
+                chunks.append(chunk)
+                size += len(chunk)
+                records += len(page)
+                # A result too large for the cache is streamed without being kept
+                if size > self.max_bytes:
+                    chunks = None
+            yield page
+        if chunks is not None and not errors:
+            chunks.append(compressor.compress(b"]") + compressor.flush())
+            self.store(key, params, expires, b"".join(chunks), records)
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"results": count, "bytes": size}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM results")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,86 @@
+import csv
+import json
+import sys
+from itertools import chain, islice
+import fortiedr_profile as profile
+
+# Output formats written row by row, with constant memory
+STREAM_FORMATS = ("jsonl", "csv", "text")
+# Widest column of a text table, longer values are truncated
+MAX_COLUMN_WIDTH = 60
+# Marker replacing the end of a truncated value
+ELLIPSIS = "…"
+
+def batched(items, size):
+    """ Group an iterable into lists of at most size items """
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+def write_jsonl(pages, file=None):
+    """ Write each record as one JSON line, flushing after every page; returns the number of records """
+    file = file or sys.stdout
+    count = 0
+    for page in pages:
+        with profile.span("render_jsonl"):
+            file.write("".join(json.dumps(record, separators=(",", ":"), default=str) + "\n" for record in page))
+            file.flush()
+        count += len(page)
+    return count
+
+def write_csv(pages, headers, file=None):
+    """ Write rows as CSV under a header line, flushing after every page; returns the number of rows """
+    file = file or sys.stdout
+    writer = csv.writer(file, lineterminator="\n")
+    writer.writerow(headers)
+    count = 0
+    for page in pages:
+        with profile.span("render_csv"):
+            writer.writerows(page)
+            file.flush()
+        count += len(page)
+    return count
+
+def fit(value, width):
+    text = "" if value is None else str(value).replace("\n", " ")
+    return text if len(text) <= width else text[:width - 1] + ELLIPSIS
+
+def write_text(pages, headers, file=None, max_width=MAX_COLUMN_WIDTH):
+    """ Write rows as a fixed-width table; widths come from the first page, capped at max_width unless it is None, and later values are truncated to fit """
+    file = file or sys.stdout
+    pages = iter(pages)
+    first_page = next(pages, [])
+
+    widths = [len(header) for header in headers]
+    for row in first_page:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len("" if value is None else str(value)))
+    if max_width is not None:
+        widths = [min(width, max_width) for width in widths]
+
+    def line(row):
+        cells = []
+        for value, width in zip(row, widths):
+            cell = fit(value, width)
+            cells.append(cell.rjust(width) if isinstance(value, (int, float)) else cell.ljust(width))
+        return "  ".join(cells).rstrip() + "\n"
+
+    file.write(line(headers))
+    file.write("  ".join("-" * width for width in widths) + "\n")
+    count = 0
+    # The first page is already in memory, the rest is streamed page by page
+    for rows in chain([first_page], pages):
+        with profile.span("render_text"):
+            file.write("".join(line(row) for row in rows))
+            file.flush()
+        count += len(rows)
+    return count
+
+def write_rows(pages, headers, output_format, file=None, max_width=MAX_COLUMN_WIDTH):
+    """ Write pages of projected rows as CSV or a text table (JSONL writes whole records, see write_jsonl) """
+    if output_format == "csv":
+        return write_csv(pages, headers, file)
+    return write_text(pages, headers, file, max_width)
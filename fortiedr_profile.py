@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every metric in the Prometheus report
+METRIC_PREFIX = "fortiedr"
+
+# Per-stage [calls, total seconds, max seconds] and named counters for this process
+_stages = {}
+_counters = {}
+_lock = threading.Lock()
+_started = time.perf_counter()
+
+@contextmanager
+def span(stage):
+    """ Time a block of code and add it to the stage totals """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            stats = _stages.get(stage)
+            if stats is None:
+                _stages[stage] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+
+def count(counter, value=1):
+    """ Add value to a named counter (requests, retries, bytes, ...) """
+    with _lock:
+        _counters[counter] = _counters.get(counter, 0) + value
+
+def reset():
+    global _started
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+
+def report():
+    """ Snapshot of every stage and counter since the process started or the last reset """
+    with _lock:
+        stages = {
+            stage: {"calls": calls, "seconds": total, "max_seconds": longest, "avg_seconds": total / calls}
+            for stage, (calls, total, longest) in sorted(_stages.items())
+        }
+        counters = dict(sorted(_counters.items()))
+        wall = time.perf_counter() - _started
+    return {"wall_seconds": wall, "stages": stages, "counters": counters}
+
+def prometheus(data=None):
+    """ Report in the Prometheus text exposition format """
+    data = data or report()
+    lines = [
+        f"# HELP {METRIC_PREFIX}_wall_seconds Wall-clock time of the run",
+        f"# TYPE {METRIC_PREFIX}_wall_seconds gauge",
+        f"{METRIC_PREFIX}_wall_seconds {data['wall_seconds']:.6f}",
+    ]
+
+    metrics = [
+        ("stage_seconds_total", "counter", "Time spent in each stage", "seconds"),
+        ("stage_calls_total", "counter", "Times each stage ran", "calls"),
+        ("stage_max_seconds", "gauge", "Longest single run of each stage", "max_seconds"),
+    ]
+    for name, kind, description, key in metrics:
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        for stage, stats in data["stages"].items():
+            lines.append(f'{METRIC_PREFIX}_{name}{{stage="{stage}"}} {stats[key]:.6g}')
+
+    for counter, value in data["counters"].items():
+        metric = f"{METRIC_PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    return "\n".join(lines) + "\n"
+
+def write_report(path):
+    """ Write the report as JSON to path and in Prometheus text format next to it (.prom) """
+    data = report()
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+    prom_path = (path[:-5] if path.endswith(".json") else path) + ".prom"
+    with open(prom_path, "w") as f:
+        f.write(prometheus(data))
+    return path, prom_path
+
+def print_report(file=None):
+    """ Print the stages sorted by total time, slowest first """
+    data = report()
+    print(f"\n{'Stage':<24} {'Calls':>7} {'Total (s)':>10} {'Avg (ms)':>9} {'Max (ms)':>9}", file=file)
+    for stage, stats in sorted(data["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{stage:<24} {stats['calls']:>7} {stats['seconds']:>10.3f} {stats['avg_seconds'] * 1000:>9.1f} {stats['max_seconds'] * 1000:>9.1f}", file=file)
+    for counter, value in data["counters"].items():
+        print(f"{counter:<24} {value:>7}", file=file)
+    print(f"Wall time: {data['wall_seconds']:.3f} s", file=file)
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+# Folder holding the samples and their index
+DEFAULT_DIR = "Malwares"
+INDEX_FILE = "index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    sha256         TEXT PRIMARY KEY,
+    file_type_mime TEXT,
+    path           TEXT NOT NULL,
+    size           INTEGER,
+    added          TEXT
+);
+CREATE TABLE IF NOT EXISTS sample_tags (
+    sha256 TEXT NOT NULL,
+    tag    TEXT NOT NULL,
+    PRIMARY KEY (tag, sha256)
+);
+CREATE INDEX IF NOT EXISTS sample_tags_sha256 ON sample_tags (sha256);
+"""
+
+class SampleStore:
+    """ Content-addressed sample folder: each sample is stored once under its SHA256, with a tag index """
+
+    def __init__(self, root=DEFAULT_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, INDEX_FILE), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def path_for(self, sha256, extension=""):
+        """ Location of a sample in the store, derived from its hash only """
+        return os.path.join(self.root, sha256.lower() + extension)
+
+    def get(self, sha256):
+        """ Return the indexed sample for a hash, or None if it is not in the store """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha256, file_type_mime, path, size, added FROM samples WHERE sha256 = ?", (sha256.lower(),)
+            ).fetchone()
+            if row is None:
+                return None
+            tags = [tag for (tag,) in self.conn.execute("SELECT tag FROM sample_tags WHERE sha256 = ?", (row[0],))]
+
+        if not os.path.exists(row[2]):
+            return None
+        return {"sha256": row[0], "file_type_mime": row[1], "path": row[2], "size": row[3], "added": row[4], "tags": tags}
+
+    def add(self, sha256, tags, file_type_mime, path):
+        """ Index a sample already written at its content-addressed path; a sample indexed again keeps its first added time """
+        sha256 = sha256.lower()
+        with self.lock:
+            # added is the reference time of coverage detection delays, so cache hits must not move it forward
+            self.conn.execute(
+                "INSERT INTO samples (sha256, file_type_mime, path, size, added) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET file_type_mime = excluded.file_type_mime, path = excluded.path, size = excluded.size",
+                (sha256, file_type_mime, path, os.path.getsize(path), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sample_tags (sha256, tag) VALUES (?, ?)", [(sha256, tag.lower()) for tag in tags or []]
+            )
+            self.conn.commit()
+
+    def by_tag(self, tag):
+        """ List the samples already in the store for a tag """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT s.sha256, s.file_type_mime, s.path, s.size, s.added FROM sample_tags t "
+                "JOIN samples s ON s.sha256 = t.sha256 WHERE t.tag = ? ORDER BY s.added DESC",
+                (tag.lower(),)
+            ).fetchall()
+        return [{"sha256": r[0], "file_type_mime": r[1], "path": r[2], "size": r[3], "added": r[4]} for r in rows]
+
+    def close(self):
+        self.conn.close()
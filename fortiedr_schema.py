@@ -0,0 +1,82 @@
+import time
+
+# Text format of converted epoch-millisecond times, as printed by the scripts
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Stand-in for a missing level while walking a path; never modified
+EMPTY = {}
+
+def get_path(record, path):
+    """ Return the value at a nested path (dict keys and list indexes), or None when any level is missing """
+    value = record
+    for key in path:
+        if isinstance(key, int):
+            if not isinstance(value, list) or not -len(value) <= key < len(value):
+                return None
+            value = value[key]
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+def compile_getter(path):
+    """ Getter for a nested path; plain dict keys are read with chained get() calls, the generic walk covers list indexes and non-dict levels """
+    path = tuple(path)
+    if not path or any(isinstance(key, int) for key in path):
+        return lambda record: get_path(record, path)
+
+    *parents, last = path
+
+    def getter(record):
+        value = record
+        try:
+            for key in parents:
+                value = value.get(key, EMPTY)
+            return value.get(last)
+        except AttributeError:
+            return get_path(record, path)
+
+    return getter
+
+def epoch_ms_to_text(values):
+    """ Epoch milliseconds to local TIME_FORMAT text for a whole column at once, None kept """
+    present = [value for value in values if value is not None]
+    if not present:
+        return list(values)
+
+    import numpy as np
+
+    seconds = np.array([value if value is not None else 0 for value in values], dtype="float64") // 1000
+    seconds = seconds.astype("int64")
+    # The local UTC offset is looked up once per distinct hour, so DST changes inside a page are honoured
+    hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    offsets = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in hours], dtype="int64")
+    local = (seconds + offsets[inverse]).astype("datetime64[s]")
+    text = np.char.replace(np.datetime_as_string(local, unit="s"), "T", " ").tolist()
+    return [converted if value is not None else None for converted, value in zip(text, values)]
+
+# Conversions applied to a whole column, by field kind
+CONVERTERS = {"time": epoch_ms_to_text}
+
+class Projection:
+    """ Declared fields, (name, path) or (name, path, kind), pulled from whole pages of nested records into columns """
+
+    def __init__(self, fields):
+        self.fields = [tuple(field) + (None,) * (3 - len(field)) for field in fields]
+        self.names = [name for name, _, _ in self.fields]
+        self.getters = [compile_getter(path) for _, path, _ in self.fields]
+
+    def columns(self, page):
+        """ name -> list of values for a page, only the declared paths are read """
+        columns = {}
+        for (name, _, kind), getter in zip(self.fields, self.getters):
+            values = list(map(getter, page))
+            if kind in CONVERTERS:
+                values = CONVERTERS[kind](values)
+            columns[name] = values
+        return columns
+
+    def rows(self, page, default="N/A"):
+        """ One list per record in field order, missing values replaced by default """
+        columns = self.columns(page).values()
+        return [[default if value is None else value for value in row] for row in zip(*columns)]
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from fortiedr_client import get_client
+
+# Tenants queried at the same time, over all hosts
+TENANT_CONCURRENCY = 16
+# Tenants queried at the same time on one management host
+HOST_CONCURRENCY = 4
+# Pages buffered between the tenant queries and the merged stream
+QUEUE_PAGES = 32
+
+def load_tenants(inventory_file):
+    """ Load the tenant inventory: {"hostConcurrency": {host: limit}, "tenants": [{"name", "host", "org", "user", "password" or "passwordEnv"}]} """
+    with open(inventory_file) as f:
+        inventory = json.load(f)
+
+    tenants = []
+    names = set()
+    for tenant in inventory.get("tenants", []):
+        tenant = dict(tenant)
+        # The same organization name may exist on several hosts
+        tenant.setdefault("name", f"{tenant['org']}@{tenant['host']}" if tenant.get("org") else tenant["host"])
+        if tenant["name"] in names:
+            raise ValueError(f"{inventory_file}: duplicate tenant name '{tenant['name']}'")
+        names.add(tenant["name"])
+        tenant.setdefault("user", os.getenv("FORTIEDR_USER"))
+        # Secrets can stay in the environment, the inventory only names the variable
+        if "passwordEnv" in tenant:
+            tenant["password"] = os.getenv(tenant.pop("passwordEnv"))
+        tenant.setdefault("password", os.getenv("FORTIEDR_PASS"))
+        tenants.append(tenant)
+    return tenants, inventory.get("hostConcurrency", {})
+
+def fan_out(tenants, query, tag, max_workers=TENANT_CONCURRENCY, host_concurrency=HOST_CONCURRENCY, host_limits=None, timeout=None, results=None):
+    """ Run query(client, errors) against every tenant at once and yield pages of records as they arrive, each record tagged by tag(record, tenant).
+
+    Tenants that fail to authenticate, raise, add to errors, or run past timeout seconds are reported in results and never hold back the others.
+    """
+    semaphores = defaultdict(lambda: threading.Semaphore(host_concurrency))
+    for host, limit in (host_limits or {}).items():
+        semaphores[host] = threading.Semaphore(limit)
+
+    pages = queue.Queue(maxsize=QUEUE_PAGES)
+    stop = threading.Event()
+    results = results if results is not None else []
+    # Tenant name -> start time of the queries currently running, and names given up on
+    running = {}
+    abandoned = set()
+    lock = threading.Lock()
+
+    def put(name, item):
+        # Give up when the stream was closed or the tenant abandoned, instead of blocking on a full queue
+        while not stop.is_set() and name not in abandoned:
+            try:
+                pages.put((name, item), timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(tenant):
+        name = tenant["name"]
+        result = {"tenant": name, "host": tenant["host"], "status": "ok", "records": 0, "seconds": 0.0, "error": None}
+        with semaphores[tenant["host"]]:
+            if stop.is_set():
+                return
+            with lock:
+                running[name] = time.monotonic()
+            started = time.perf_counter()
+            errors = []
+            try:
+                client = get_client(tenant["host"], tenant["user"], tenant["password"], tenant.get("org"))
+                for page in query(client, errors):
+                    if not put(name, [tag(record, tenant) for record in page]):
+                        break
+                    result["records"] += len(page)
+                if errors:
+                    # The page iterators stop at the first failed request instead of raising
+                    result.update(status="failed", error="; ".join(str(error) for error in errors))
+            except PermissionError as e:
+                result.update(status="auth failed", error=str(e))
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+            result["seconds"] = time.perf_counter() - started
+        put(name, result)
+
+    tasks = queue.Queue()
+    for tenant in tenants:
+        tasks.put(tenant)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                tenant = tasks.get_nowait()
+            except queue.Empty:
+                return
+            run(tenant)
+
+    try:
+        # Daemon threads: a tenant stuck in a request past the timeout does not keep the process alive on exit
+        for _ in range(min(max_workers, len(tenants))):
+            threading.Thread(target=worker, daemon=True).start()
+        remaining = {tenant["name"] for tenant in tenants}
+        hosts = {tenant["name"]: tenant["host"] for tenant in tenants}
+
+        while remaining:
+            try:
+                name, item = pages.get(timeout=1)
+            except queue.Empty:
+                name, item = None, None
+
+            if timeout:
+                # A tenant stuck in a request is dropped from the stream once it runs past the timeout
+                now = time.monotonic()
+                with lock:
+                    late = [late_name for late_name, started in running.items() if late_name in remaining and now - started > timeout]
+                    abandoned.update(late)
+                for late_name in late:
+                    remaining.discard(late_name)
+                    results.append({"tenant": late_name, "host": hosts[late_name], "status": "timeout", "records": None, "seconds": timeout, "error": f"no result within {timeout}s"})
+
+            if name is None or name in abandoned:
+                continue
+            if isinstance(item, dict):
+                results.append(item)
+                remaining.discard(name)
+            elif item:
+                yield item
+    finally:
+        stop.set()
+
+def display_tenant_results(results):
+    """ Per-tenant status of a fan-out, on stderr so it stays out of piped results """
+    print(f"\n{'Tenant':<24} {'Host':<32} {'Status':<12} {'Records':>8} {'Seconds':>8}  Error", file=sys.stderr)
+    for result in sorted(results, key=lambda r: r["tenant"]):
+        print(f"{result['tenant']:<24} {result['host']:<32} {result['status']:<12} {result['records'] if result['records'] is not None else '-':>8} {result['seconds']:>8.2f}  {result['error'] or ''}", file=sys.stderr)